@@ -0,0 +1,74 @@
+import argparse
+import contextlib
+import io
+import time
+
+from game_engine import FastMapState
+from voronoi_game import VoronoiGame
+
+
+class MapStateTimer:
+    """Wraps FastMapState.update_map_state to accumulate the time spent computing occupancy maps"""
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self._update_map_state = FastMapState.update_map_state
+
+    def __enter__(self):
+        timer = self
+
+        def update_map_state(fast_map, units):
+            start = time.perf_counter()
+            result = timer._update_map_state(fast_map, units)
+            timer.time += time.perf_counter() - start
+            timer.calls += 1
+            return result
+
+        FastMapState.update_map_state = update_map_state
+        return self
+
+    def __exit__(self, *exc):
+        FastMapState.update_map_state = self._update_map_state
+
+
+def run_game(player_list, args, reuse_end_state):
+    VoronoiGame.reuse_end_state = reuse_end_state
+    with MapStateTimer() as timer, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        game = VoronoiGame(player_list, args)
+        elapsed = time.perf_counter() - start
+    return game, timer, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the occupancy map updates of a headless game, with and "
+                                                 "without reusing the end of day state when no unit is killed")
+    parser.add_argument("--spawn", type=int, default=5, help="Number of days after which a new unit spawns")
+    parser.add_argument("--last", type=int, default=1000, help="Total number of days the game goes on for")
+    parser.add_argument("--seed", "-s", type=int, default=2, help="Seed used by random number generator")
+    parser.add_argument("--players", nargs=4, default=["d", "d", "d", "d"], help="The 4 players of the game")
+    args = parser.parse_args()
+    player_list = tuple(args.players)
+    args.no_gui = True
+    args.disable_logging = True
+    args.disable_timeout = True
+    args.log_path = ""
+    args.dump_state = False
+    args.profile = None
+    args.player_clock = "cpu"
+    args.disable_gc_in_play = False
+    args.sandbox = False
+    args.parallel_play = False
+    args.move_log = None
+
+    results = {}
+    for reuse_end_state in [False, True]:
+        game, timer, elapsed = run_game(player_list, args, reuse_end_state)
+        results[reuse_end_state] = (game, timer, elapsed)
+        print("reuse_end_state={}: game {:.3f}s, update_map_state {} calls {:.3f}s".format(
+            reuse_end_state, elapsed, timer.calls, timer.time))
+
+    (full_game, full_timer, full_elapsed), (game, timer, elapsed) = results[False], results[True]
+    assert full_game.player_total_score[-1] == game.player_total_score[-1], "End of day reuse changed the result"
+    print("Skipped {} of {} end of day recomputes, saved {:.3f}s of update_map_state".format(
+        full_timer.calls - timer.calls, args.last, full_timer.time - timer.time))
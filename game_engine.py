@@ -0,0 +1,1020 @@
+import concurrent.futures
+import contextlib
+import logging
+import os
+import signal
+import time
+
+import cv2
+import numpy as np
+import scipy
+import scipy.ndimage
+import scipy.spatial
+from shapely.geometry import Point
+
+import constants
+from game_state import GameState, UnitState, get_play_inputs
+from player_sandbox import PlayerSandbox
+from player_timer import PlayerTimer
+from utils import *
+from players.default_player import Player as DefaultPlayer
+from players.g1_player import Player as G1_Player
+from players.g2_player import Player as G2_Player
+from players.g3_player import Player as G3_Player
+from players.g4_player import Player as G4_Player
+from players.g5_player import Player as G5_Player
+from players.g6_player import Player as G6_Player
+from players.g7_player import Player as G7_Player
+from players.g8_player import Player as G8_Player
+from players.g9_player import Player as G9_Player
+
+
+class GameEngine:
+    reuse_end_state = True  # Skip end of day occupancy recompute when no unit is killed
+    # Phases of a day timed by the profiler, in order. play_<i> is the play() call of the player in slot i.
+    profile_phases = ("state_copy", "occupancy_0", "play_inputs", "play_1", "play_2", "play_3", "play_4",
+                      "parallel_play", "sandbox_play", "moves", "occupancy_1", "connectivity", "kills", "occupancy_2")
+
+    def __init__(self, spawn_day, last_day, logger=None, use_timeout=True, profiler=None, player_clock="cpu",
+                 disable_gc_in_play=False, sandbox=False, parallel_play=False, move_recorder=None):
+        """Headless game engine. Construct once, then play any number of games with reset() and step()/run().
+
+        Args:
+            spawn_day: Number of days after which a new unit spawns at the home base
+            last_day: Total number of days the game goes on for
+            logger: Logger of the engine, player loggers are its children. Default: no handlers, disabled.
+            use_timeout: Timeout player initialization. play() calls are always charged to the time budget of players,
+                which are no longer called once it is used.
+            profiler: profiler.DayProfiler recording the time spent in each phase of each day. Default: no profiling.
+            player_clock: Clock charging play() calls to the time budget of players, see PlayerTimer.clocks.
+                "cpu" (default) charges the CPU time of the process during the call, including other threads such as
+                a log writing thread. "thread" only charges the calling thread, "wall" the elapsed time.
+            disable_gc_in_play: Keep the garbage collector disabled during play() calls
+            sandbox: Run each player in its own worker process, with play() calls of all players running
+                concurrently and hard wall-clock timeouts. See PlayerSandbox. Call close() when done.
+            parallel_play: Run the play() calls of all players concurrently in threads of this process, then apply
+                their moves in player order. Speeds up players spending their time in code releasing the GIL
+                (NumPy, SciPy, shapely, torch). The cpu clock counts all threads of the process, so calls are
+                charged with the thread clock instead. Ignored with sandbox, which already runs players
+                concurrently. Call close() when done.
+            move_recorder: MoveRecorder. Records the moves received from players, instead of writing them to the
+                debug log.
+        """
+        self.spawn_day = spawn_day
+        self.last_day = last_day
+        self.use_timeout = use_timeout
+        if logger is None:
+            logger = logging.getLogger(__name__)
+            logger.setLevel(logging.ERROR)
+            logger.disabled = True
+        self.logger = logger
+        self.profiler = profiler
+        self.move_recorder = move_recorder
+        self.sandbox = None
+        self.play_executor = None
+        if sandbox:
+            max_units = constants.no_of_players * ((last_day - 1) // spawn_day + 1)
+            self.sandbox = PlayerSandbox(max_units, player_clock, disable_gc_in_play)
+        elif parallel_play:
+            self.play_executor = concurrent.futures.ThreadPoolExecutor(constants.no_of_players,
+                                                                       thread_name_prefix="play")
+            if player_clock == "cpu":
+                player_clock = "thread"
+        self.player_timer = PlayerTimer(constants.no_of_players, player_clock, disable_gc_in_play)
+
+        self.base = []
+        for i in range(constants.no_of_players):
+            self.base.append(Point(constants.base[i]))
+
+        # Cell coords are precomputed once and reused across games
+        self.fast_map = FastMapState(constants.max_map_dim, constants.base, incremental=True)
+
+        self.seed = None
+        self.seed_sequence = None
+        self.day = 0
+        self.players = []
+        self.player_names = []
+        self.player_time = []
+        self.player_timeout = []
+        self.player_timeout_day = []
+        self.game_state = None
+        self.map_states = None
+        self.player_score = None
+        self.player_total_score = None
+        self.unit_id = None
+        self.unit_pos = None
+
+    def reset(self, seed, player_list):
+        """Start a new game
+
+        Args:
+            seed: Seed used by random number generator, None to have different random behavior on each game.
+                Each slot gets its own generator derived from it, see get_player_rng().
+            player_list: Players in each of the 4 slots, from constants.possible_players
+        """
+        self.seed = seed
+        self.seed_sequence = np.random.SeedSequence(seed)
+        if seed is None:
+            self.logger.info("Initialise random number generator with no seed, entropy {}".format(
+                self.seed_sequence.entropy))
+        else:
+            self.logger.info("Initialise random number generator with seed {}".format(seed))
+
+        self.day = 0
+        self.fast_map.reset()
+        if self.profiler is not None:
+            self.profiler.reset()
+        if self.move_recorder is not None:
+            self.move_recorder.reset()
+
+        self.players = []
+        self.player_names = []
+
+        self.player_timer.reset()
+        self.player_time = [self.last_day for i in range(constants.no_of_players)]
+        self.player_timeout = [False for i in range(constants.no_of_players)]
+        self.player_timeout_day = [0 for i in range(constants.no_of_players)]
+
+        self.game_state = GameState(self.last_day, constants.max_map_dim)
+        self.map_states = self.game_state.map_states
+        self.player_score = self.game_state.player_score
+        self.player_total_score = self.game_state.player_total_score
+        self.unit_id = self.game_state.unit_id
+        self.unit_pos = self.game_state.unit_pos
+
+        self.add_players(player_list)
+
+    @property
+    def done(self) -> bool:
+        return self.day >= self.last_day
+
+    def close(self):
+        """Stop the worker processes of sandboxed players, or the threads of parallel play() calls"""
+        if self.sandbox is not None:
+            self.sandbox.close()
+        if self.play_executor is not None:
+            self.play_executor.shutdown()
+
+    def step(self) -> int:
+        """Play the next day of the game
+
+        Returns:
+            int: The day that was played
+        """
+        if self.done:
+            raise RuntimeError("Game is over, call reset() to start a new game")
+        day = self.day
+        self.play_day(day)
+        self.day += 1
+        return day
+
+    def run(self):
+        """Play the remaining days of the game"""
+        while not self.done:
+            self.step()
+
+    def add_players(self, player_list):
+        player_count = dict()
+        for player_name in player_list:
+            if player_name not in player_count:
+                player_count[player_name] = 0
+            player_count[player_name] += 1
+
+        count_used = {k: 0 for k in player_count}
+
+        i = 0
+        for player_name in player_list:
+            if player_name in constants.possible_players:
+                if player_name.lower() == "d":
+                    player_class = DefaultPlayer
+                    base_player_name = "Default Player"
+                else:
+                    player_class = eval("G{}_Player".format(player_name))
+                    base_player_name = "Group {}".format(player_name)
+
+                count_used[player_name] += 1
+                if player_count[player_name] == 1:
+                    self.add_player(player_class, "{}".format(base_player_name), base_player_name=base_player_name,
+                                    idx=i)
+                else:
+                    self.add_player(player_class, "{}.{}".format(base_player_name, count_used[player_name]),
+                                    base_player_name=base_player_name, idx=i)
+            else:
+                self.logger.error("Failed to insert player {} since invalid player name provided.".format(player_name))
+
+            i += 1
+
+    def get_player_rng(self, idx) -> np.random.Generator:
+        """Random number generator of the player in slot idx.
+
+        Each slot has its own stream, keyed by the seed of the game and the slot only, as SeedSequence.spawn()
+        would derive it. A player's random behavior therefore does not depend on the other players, the order
+        of their play() calls, whether they run concurrently or in worker processes, or on players timing out.
+        """
+        seed_sequence = np.random.SeedSequence(self.seed_sequence.entropy, spawn_key=(idx,))
+        return np.random.default_rng(seed_sequence)
+
+    def add_player(self, player_class, player_name, base_player_name, idx):
+        if player_name not in self.player_names:
+            self.logger.info(
+                "Adding player {} from class {}".format(player_name, player_class.__module__))
+            precomp_dir = os.path.join("precomp", base_player_name)
+            os.makedirs(precomp_dir, exist_ok=True)
+
+            player_logger = self.get_player_logger(player_name)
+            player_kwargs = dict(total_days=self.last_day, spawn_days=self.spawn_day, player_idx=idx,
+                                 spawn_point=self.base[idx], min_dim=constants.min_map_dim,
+                                 max_dim=constants.max_map_dim, precomp_dir=precomp_dir)
+            player_kwargs["rng"] = self.get_player_rng(idx)
+            if self.sandbox is not None:
+                # The player lives in its worker process, its class stands in for it
+                timeout = constants.timeout if self.use_timeout else None
+                is_created, init_time = self.sandbox.init_player(idx, player_class, player_kwargs, player_logger,
+                                                                 timeout)
+                is_timeout = not is_created
+                player = player_class if is_created else None
+            else:
+                start_time = 0
+                is_timeout = False
+                if self.use_timeout:
+                    signal.signal(signal.SIGALRM, timeout_handler)
+                    signal.alarm(constants.timeout)
+                try:
+                    start_time = time.time()
+                    player = player_class(logger=player_logger, **player_kwargs)
+                    if self.use_timeout:
+                        signal.alarm(0)  # Clear alarm
+                except TimeoutException:
+                    is_timeout = True
+                    player = None
+
+                init_time = time.time() - start_time
+
+            if is_timeout:
+                self.logger.error(
+                    "Initialization Timeout {} since {:.3f}s reached.".format(player_name, constants.timeout))
+
+            if not is_timeout:
+                self.logger.info("Initializing player {} took {:.3f}s".format(player_name, init_time))
+            self.players.append(player)
+            self.player_names.append(player_name)
+        else:
+            self.logger.error("Failed to insert player as another player with name {} exists.".format(player_name))
+
+    def get_player_logger(self, player_name):
+        player_logger = logging.getLogger("{}.{}".format(self.logger.name, player_name))
+        player_logger.setLevel(logging.ERROR)
+        player_logger.disabled = True
+        return player_logger
+
+    def profile(self, phase):
+        """Time a phase of the current day, if profiling"""
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.phase(phase)
+
+    def play_day(self, day):
+        if self.profiler is not None:
+            self.profiler.start_day(day)
+
+        if day != 0:
+            units = self.game_state.get_units(day - 1, 2)
+        else:
+            units = UnitState.empty()
+
+        if day % self.spawn_day == 0:
+            # new unit spawned. Cannot copy prev day scores. Re-calculate the scores.
+            with self.profile("occupancy_0"):
+                units = units.spawn(constants.base, (day // self.spawn_day) + 1)
+                self.game_state.set_units(day, 0, units)
+                score, map_state = self.fast_map.update_map_state(units)
+                self.player_score[day][0] = score
+                self.map_states[day][0] = map_state
+        else:
+            # copy prev day's end state and score to this day's init state and score
+            with self.profile("state_copy"):
+                self.game_state.set_units(day, 0, units)
+                self.map_states[day][0] = self.map_states[day - 1][2]
+
+                for i in range(constants.no_of_players):
+                    self.player_score[day][0][i] = self.player_score[day - 1][2][i]
+
+        new_pos = units.pos.copy()
+        actions = self.get_actions(day, units)
+        for i in range(constants.no_of_players):
+            with self.profile("moves"):
+                self.apply_action(actions[i], units, i, new_pos)
+
+        # State/score after units have moved
+        with self.profile("occupancy_1"):
+            moved_units = units.moved(new_pos)
+            self.game_state.set_units(day, 1, moved_units)
+            score, map_state = self.fast_map.update_map_state(moved_units)
+            self.player_score[day][1] = score
+            self.map_states[day][1] = map_state
+
+        # for i in range(constants.no_of_players):
+        #     self.check_path_home(day, i)
+        with self.profile("connectivity"):
+            connectivity_map = self.fast_map.get_connectivity_map()
+        with self.profile("kills"):
+            units_alive = self.fast_map.check_path_home(moved_units, connectivity_map)
+        num_killed = moved_units.num_units - units_alive.num_units
+
+        # State/score at end of day (killed isolated units)
+        if num_killed > 0 or not self.reuse_end_state:
+            with self.profile("occupancy_2"):
+                self.game_state.set_units(day, 2, units_alive)
+                score, map_state = self.fast_map.update_map_state(units_alive)
+        else:
+            # No unit killed, end of day is same as after units moved
+            self.game_state.set_units(day, 2, moved_units)
+            score, map_state = self.player_score[day][1][:], self.map_states[day][1]
+        self.player_score[day][2] = score
+        self.map_states[day][2] = map_state
+
+        # Total score
+        for i in range(constants.no_of_players):
+            self.player_total_score[day][i] = self.player_total_score[day-1][i] + self.player_score[day][2][i]
+
+        if self.profiler is not None:
+            self.record_day_counts(day, units, units_alive)
+
+    def get_actions(self, day, units):
+        """Call play() of each player with units on the map and time left, and charge it the time taken
+
+        Returns:
+            List. Action returned by each player. None if the player was not called, failed or ran out of time.
+        """
+        players = [i for i in range(constants.no_of_players) if units.count(i) > 0 and not self.player_timeout[i]]
+        if self.sandbox is not None:
+            actions, call_times = self.get_sandboxed_actions(day, units, players)
+        else:
+            actions, call_inputs = dict(), dict()
+            play_inputs = dict()  # Inputs to play() for each player api version, converted once per day if needed
+            cell_ownership = None  # Owning unit of each cell, computed once per day if a player asks for it
+            for i in players:
+                api_version = getattr(self.players[i], "api_version", 1)
+                with self.profile("play_inputs"):
+                    if api_version not in play_inputs:
+                        play_inputs[api_version] = self.get_play_inputs(day, units, api_version)
+                    player_inputs = play_inputs[api_version]
+                    if getattr(self.players[i], "cell_ownership", False):
+                        if cell_ownership is None:
+                            cell_ownership = self.get_cell_ownership(units)
+                        player_inputs = dict(player_inputs, **cell_ownership)
+                call_inputs[i] = dict(player_inputs, current_scores=self.player_score[day][0],
+                                      total_scores=self.player_total_score[day])
+
+            if self.play_executor is not None:
+                with self.profile("parallel_play"):
+                    futures = {i: self.play_executor.submit(self.call_play, i, call_inputs[i]) for i in players}
+                    actions = {i: future.result() for i, future in futures.items()}
+            else:
+                for i in players:
+                    with self.profile("play_{}".format(i + 1)):
+                        actions[i] = self.call_play(i, call_inputs[i])
+            call_times = {i: self.player_timer.last_call_time(i) for i in players}
+
+        for i in call_times:
+            self.player_time[i] -= call_times[i]
+            if self.player_time[i] <= 0:
+                self.player_timeout[i] = True
+                self.player_timeout_day[i] = day+1
+                actions[i] = None
+        return [actions.get(i) for i in range(constants.no_of_players)]
+
+    def call_play(self, idx, play_inputs):
+        """Timed play() call of player idx. None if it fails."""
+        with self.player_timer.time_call(idx):
+            try:
+                return self.players[idx].play(**play_inputs)
+            except Exception:
+                return None
+
+    def get_sandboxed_actions(self, day, units, players):
+        """Concurrent play() calls of sandboxed players. A player that does not answer within its time left is
+        stopped and charged all of it."""
+        players = [i for i in players if self.sandbox.is_alive(i)]
+        with self.profile("play_inputs"):
+            cell_ownership = None
+            if any(getattr(self.players[i], "cell_ownership", False) for i in players):
+                cell_ownership = self.get_cell_ownership(units)
+        with self.profile("sandbox_play"):
+            results = self.sandbox.play(day, units, self.map_states[day][0], self.player_score[day][0],
+                                        self.player_total_score[day], players, self.player_time, cell_ownership)
+
+        actions, call_times = dict(), dict()
+        for i in players:
+            actions[i], call_times[i] = results[i]
+            if call_times[i] is None:
+                self.logger.error("{} stopped since it did not answer in time".format(self.player_names[i]))
+                call_times[i] = self.player_time[i]
+            self.player_timer.add_call_time(i, call_times[i])
+        return actions, call_times
+
+    def apply_action(self, returned_action, units, idx, new_pos):
+        """Move the units of a player in new_pos, if its action is valid"""
+        if self.check_action(returned_action, units, idx):
+            moves = self.get_moves(returned_action)
+            if moves is not None:
+                is_valid = np.isfinite(moves).all(axis=1)
+                self.log_moves(moves, is_valid, units, idx)
+                player_pos = new_pos[units.offsets[idx]:units.offsets[idx + 1]]
+                player_pos[is_valid] = move_units(player_pos[is_valid], moves[is_valid, 0], moves[is_valid, 1])
+                return
+        self.logger.info("{} failed since provided invalid action {}".format(self.player_names[idx], returned_action))
+
+    def record_day_counts(self, day, units, units_alive):
+        """Unit, kill and disputed cell counts of the day, for the profiler"""
+        counts = dict()
+        for i in range(constants.no_of_players):
+            counts["units_{}".format(i + 1)] = units.count(i)
+            counts["killed_{}".format(i + 1)] = units.count(i) - units_alive.count(i)
+        for state in range(constants.day_states):
+            counts["disputed_{}".format(state)] = int(np.count_nonzero(self.map_states[day][state] == -1))
+        self.profiler.record(**counts)
+
+    def get_play_inputs(self, day, units, api_version):
+        """Game state given to play() at the start of the day, see get_play_inputs().
+        Lists are taken from the game state, which keeps them for the GUI.
+        """
+        if api_version >= 2:
+            return get_play_inputs(units, self.map_states[day][0], api_version)
+
+        return dict(
+            unit_id=self.unit_id[day][0],
+            unit_pos=self.unit_pos[day][0],
+            map_states=self.map_states[day][0].tolist())
+
+    def get_cell_ownership(self, units):
+        """Unit owning each cell at the start of the day, given to players with a cell_ownership class attribute
+
+        A cell occupied by a player is owned by the player's nearest unit, as found by the occupancy computation.
+            cell_unit - int32 array of shape [100, 100] indexed as cell_unit[x][y]. Index of the owning unit in
+                unit_pos[player] / unit_id[player] of the player occupying the cell. -1 for disputed cells.
+            unit_cells - unit_cells[player] - int array of shape [N,]. Number of cells owned by each unit.
+        """
+        # The last occupancy map computed is the start of day map: the previous day's end state is today's start
+        cell_unit, unit_cells = self.fast_map.get_unit_ownership(units)
+        is_owned = cell_unit >= 0
+        player_cell_unit = np.full_like(cell_unit, -1)
+        player_cell_unit[is_owned] = cell_unit[is_owned] - units.offsets[units.player[cell_unit[is_owned]]]
+        player_cell_unit.flags.writeable = False
+        unit_cells.flags.writeable = False
+        return dict(
+            cell_unit=player_cell_unit.T,
+            unit_cells=[unit_cells[units.offsets[i]:units.offsets[i + 1]] for i in range(constants.no_of_players)])
+
+    def check_action(self, returned_action, units, idx):
+        if not returned_action:
+            return False
+        if not isinstance(returned_action[0], tuple):
+            return False  # Ensure no one is using sympy
+
+        is_valid = False
+        if len(returned_action) == units.count(idx):
+            is_valid = True
+
+        return is_valid
+
+    def get_moves(self, returned_action):
+        """Convert a valid action to an array of moves in one pass
+
+        Returns:
+            np.ndarray: Shape: [N, 2]. (distance, angle) of each unit. None if the moves are not all pairs of numbers.
+                None is converted to nan: moves with a non-finite value are invalid, the unit does not move.
+        """
+        try:
+            moves = np.array(returned_action, dtype=np.float64)
+        except (TypeError, ValueError):
+            return None
+        if moves.ndim != 2 or moves.shape[1] != 2:
+            return None
+        return moves
+
+    def log_moves(self, moves, is_valid, units, idx):
+        if self.move_recorder is not None:
+            self.move_recorder.record(self.day, idx, units.player_ids(idx), moves)
+        log_valid = self.move_recorder is None and self.logger.isEnabledFor(logging.DEBUG)
+        # Lines in the order of the units: each run of valid moves is one record, only formatted when written
+        start = 0
+        for j in np.flatnonzero(~is_valid).tolist() + [len(moves)]:
+            if log_valid and j > start:
+                self.logger.debug(_MovesMessage(moves[start:j], self.player_names[idx]))
+            if j < len(moves):
+                self.logger.info(
+                    "{} {} failed since provided invalid move {} (must contain tuples of finite value)".format(
+                        self.player_names[idx], units.player_ids(idx)[j], tuple(moves[j].tolist())))
+            start = j + 1
+
+    def move_unit(self, distance, angle, pos):
+        """New position (x, y) of a unit at pos after moving distance km at angle radians, clipped to the map"""
+        angle = float(angle)
+        a, b = float(pos[0]), float(pos[1])
+        if distance > 1.0:
+            distance = 1.0
+            self.logger.debug("Distance rectified to max distance of 1 km")
+
+        new_a = a + (distance * np.cos(angle))
+        new_b = b + (distance * np.sin(angle))
+
+        if new_a < 0:
+            new_a = 0
+            new_b = b + (-a * np.tan(angle))
+        elif new_a >= 100:
+            new_a = 99.99999999
+            new_b = b + ((new_a-a) * np.tan(angle))
+
+        if new_b < 0:
+            new_b = 0
+            new_a = a + (-b / np.tan(angle))
+        elif new_b >= 100:
+            new_b = 99.99999999
+            new_a = a + ((new_b-b) / np.tan(angle))
+
+        return new_a, new_b
+
+    def get_state(self, day, state=0):
+        return_dict = self.game_state.get_state(day, state)
+        return_dict["player_names"] = self.player_names
+        return_dict["player_timeout_day"] = self.player_timeout_day
+        return return_dict
+
+
+class _MovesMessage:
+    def __init__(self, moves, player_name):
+        """Debug log lines of the valid moves of a player, formatted when converted to str"""
+        self.moves = moves
+        self.player_name = player_name
+
+    def __str__(self):
+        lines = []
+        for distance, angle in self.moves.tolist():
+            lines.append("Received Distance: {:.3f}, Angle: {:.3f} from {}".format(distance, angle, self.player_name))
+            if distance > 1.0:
+                lines.append("Distance rectified to max distance of 1 km")
+        return "\n".join(lines)
+
+
+def move_units(pos, distance, angle) -> np.ndarray:
+    """Vectorized GameEngine.move_unit: new positions (x, y) of units after moving, clipped to the map
+
+    Args:
+        pos: Shape: [..., 2]. Position (x, y) of each unit.
+        distance: Shape: [...]. Distance to move, in km. Capped at 1km. Must be finite.
+        angle: Shape: [...]. Direction of the move, in radians. Must be finite.
+
+    Returns:
+        np.ndarray: Shape: [..., 2]. Same values as move_unit() for each unit.
+    """
+    pos = np.asarray(pos, dtype=np.float64)
+    a, b = pos[..., 0], pos[..., 1]
+    distance = np.minimum(np.asarray(distance, dtype=np.float64), 1.0)
+    angle = np.asarray(angle, dtype=np.float64)
+
+    new_a = a + (distance * np.cos(angle))
+    new_b = b + (distance * np.sin(angle))
+
+    # Same sequence of clips as move_unit(). A unit moving along a wall can divide by a zero tan, like move_unit().
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tan = np.tan(angle)
+        below, above = new_a < 0, new_a >= 100
+        new_b = np.where(below, b + (-a * tan), np.where(above, b + ((99.99999999 - a) * tan), new_b))
+        new_a = np.where(below, 0.0, np.where(above, 99.99999999, new_a))
+
+        below, above = new_b < 0, new_b >= 100
+        new_a = np.where(below, a + (-b / tan), np.where(above, a + ((99.99999999 - b) / tan), new_a))
+        new_b = np.where(below, 0.0, np.where(above, 99.99999999, new_b))
+
+    return np.stack((new_a, new_b), axis=-1)
+
+
+class FastMapState:
+    occupancy_backends = ("grid", "kdtree")
+
+    def __init__(self, map_size, base_loc, occupancy_backend="grid", incremental=False):
+        """Fast computation of occupancy map, scores and killed units
+
+        Args:
+            map_size: Width of the map, in km. Each cell is 1km wide.
+            base_loc: Home base location (x, y) of each player.
+            occupancy_backend: How the nearest unit of each cell is found.
+                "grid": Exact squared integer distances over the grid of cell centers, ties resolved in bulk.
+                "kdtree": KD-tree nearest neighbor query, ties resolved cell by cell.
+            incremental: Only recompute cells whose nearest units could have changed since the previous
+                computation. Output is identical to a full recompute. Requires the grid backend.
+        """
+        if occupancy_backend not in self.occupancy_backends:
+            raise ValueError(f"Unknown occupancy backend: {occupancy_backend}")
+        if incremental and occupancy_backend != "grid":
+            raise ValueError(f"Incremental occupancy requires the grid backend")
+        self.map_size = map_size
+        self.spawn_loc = base_loc
+        self.occupancy_backend = occupancy_backend
+        self.incremental = incremental
+
+        self.cell_origins = self._compute_cell_coords(map_size)
+        self.cell_idx = np.indices((map_size, map_size))  # Shape: [2, N, N]. Row, col index of each cell
+        # Unit occupancy from the bitmask of players with a unit in a cell (bit p set for player p).
+        # 0 = not computed, single bit = player, multiple bits = multiple players
+        self.unit_occ_lut = np.full(1 << 4, 4, dtype=np.uint8)
+        self.unit_occ_lut[0] = 5
+        self.unit_occ_lut[[1, 2, 4, 8]] = [0, 1, 2, 3]
+        self.occupancy_map = None  # 2d state map
+        self._num_contested_pts_check = 100  # In case of dispute, how many cells at identical dist to check
+
+        # Incremental mode: inputs/outputs of the previous computation
+        self._unit_occ_map = None  # Cells containing units. Shape: [N, N]
+        self._nearest_dist = None  # Squared dist to the nearest unit of any player. Shape: [N, N]
+        self._max_incremental_pairs = 2 ** 18  # Above this many (cell, unit) pairs, a full recompute is cheaper
+
+        home_cells = np.array(base_loc).astype(int)  # Shape: [4, 2]. (x, y) cell of each home base
+        self.home_rows, self.home_cols = home_cells[:, 1], home_cells[:, 0]
+        # Connectivity of the previous computation. Only players whose cells changed are labelled again.
+        self._connected_occ_map = None  # Occupancy map the connectivity map was computed from. Shape: [N, N]
+        self._connectivity_map = None  # Shape: [N, N]
+
+    def reset(self):
+        """Forget the previous computation, before starting a new game"""
+        self.occupancy_map = None
+        self._unit_occ_map = None
+        self._nearest_dist = None
+        self._connected_occ_map = None
+        self._connectivity_map = None
+
+    def update_map_state(self, units: UnitState) -> tuple[list[int], np.ndarray]:
+        """Replaces func with same name in old logic
+        Compute the occupancy map and scores
+
+        Returns:
+            count: Number of cells occupied by each player.
+            map_state: Shape: [N, N]. int8 map_state[x][y]. -1 is disputed, 1-4 is players.
+        """
+        self.compute_occupancy_map(units)
+        count = np.bincount(self.occupancy_map.ravel(), minlength=5)[:4].tolist()
+
+        # Convert occupancy map to map_states. -1 is disputed, 1-4 is players.
+        map_state = self.occupancy_map.astype(np.int8) + 1  # occ map is uint8, so cannot represent neg int
+        map_state[map_state == 5] = -1
+        return count, map_state.T
+
+    def check_path_home(self, units: UnitState, connectivity_map: np.ndarray = None) -> UnitState:
+        """Replaces func with same name in old logic
+        Kill isolated units. Always check against units after moving.
+
+        Returns:
+            UnitState: Units still alive. Same object if no unit was killed.
+        """
+        return self.remove_killed_units(units, connectivity_map)
+
+    def compute_occupancy_map(self, units: UnitState, mask_grid_pos: np.ndarray = None):
+        """Calculates the occupancy status of each cell in the grid
+
+        Args:
+            units: Units of a state of the day (init, after unit move, after unit kill).
+            mask_grid_pos: Shape: [N, N]. If provided, only occupancy of these cells will be computed.
+                Used when updating occupancy map.
+        """
+        # Which cells contain units
+        occ_map = self.get_unit_occupied_cells(units)
+        if self.incremental and mask_grid_pos is None:
+            self._compute_occupancy_incremental(occ_map)
+        elif self.occupancy_backend == "grid":
+            self._compute_occupancy_grid(occ_map, mask_grid_pos)
+        else:
+            self._compute_occupancy_kdtree(occ_map, mask_grid_pos)
+        return
+
+    def _compute_occupancy_kdtree(self, occ_map, mask_grid_pos: np.ndarray = None):
+        """KD-tree backend. Disputes are resolved with an extra query per tied cell."""
+        occ_cell_pts = self.cell_origins[occ_map < 4]  # list of unit
+        player_ids = occ_map[occ_map < 4]  # Shape: [N,]. player id for each occ cell
+        if player_ids.shape[0] < 1:
+            raise ValueError(f"No units on the map")
+
+        # Create KD-tree with all occupied cells
+        kdtree = scipy.spatial.KDTree(occ_cell_pts)
+
+        # Query points: coords of each cell whose occupancy is not computed yet
+        if mask_grid_pos is None:
+            mask = (occ_map > 4)  # Not computed points
+        else:
+            mask = (occ_map > 4) & mask_grid_pos
+            occ_map = self.occupancy_map  # Update existing map
+        candidate_cell_pts = self.cell_origins[mask]  # Shape: [N, 2]
+
+        # For each query pt, get associated player (nearest cell with unit)
+        # Find nearest 2 points to identify if multiple cells at same dist
+        near_dist, near_idx = kdtree.query(candidate_cell_pts, k=2)
+
+        # Resolve disputes for cells with more than 1 occupied cells at same distance
+        disputed = np.isclose(near_dist[:, 1] - near_dist[:, 0], 0)
+        disputed_cell_pts = candidate_cell_pts[disputed]  # Shape: [N, 2].
+        if disputed_cell_pts.shape[0] > 0:
+            # Distance of the nearest cell will be radius of our search
+            radius_of_dispute = near_dist[disputed, 0]  # Shape: [N, ]
+            occ_map = self._filter_disputes(occ_map, kdtree, disputed_cell_pts, radius_of_dispute, player_ids)
+
+        # For the rest of the cells (undisputed), mark occupancy
+        not_disputed_ids = player_ids[near_idx[~disputed, 0]]  # Get player id of the nearest cell
+        not_disputed_cells = candidate_cell_pts[~disputed].astype(int)  # cell idx from coords of occupied cells
+        occ_map[not_disputed_cells[:, 0], not_disputed_cells[:, 1]] = not_disputed_ids
+
+        self.occupancy_map = occ_map
+        return
+
+    def _compute_occupancy_grid(self, occ_map, mask_grid_pos: np.ndarray = None):
+        """Grid backend. Exact squared distances between cell centers are integers, so ties are exact.
+
+        For each player, a Euclidean feature transform gives the nearest cell containing a unit of that player.
+        A cell belongs to the player with the strictly smallest squared distance; if the nearest distance is shared
+        by several players, the cell is disputed. Same output as the KD-tree backend.
+        """
+        if not np.any(occ_map < 4):
+            raise ValueError(f"No units on the map")
+
+        # Squared dist to the nearest unit of each player. Shape: [4, N, N]
+        player_dist = self.get_player_dist_map(occ_map)
+        owner, nearest_dist = self._nearest_owner(player_dist)
+
+        if mask_grid_pos is None:
+            mask = (occ_map > 4)  # Not computed points
+            self._unit_occ_map = occ_map.copy()
+            self._nearest_dist = nearest_dist
+        else:
+            mask = (occ_map > 4) & mask_grid_pos
+            occ_map = self.occupancy_map  # Update existing map
+            self._unit_occ_map = None  # Partial update, next incremental computation must start from scratch
+        occ_map[mask] = owner[mask]
+
+        self.occupancy_map = occ_map
+        return
+
+    def _compute_occupancy_incremental(self, occ_map):
+        """Update the previous occupancy map, only recomputing cells affected by units that changed cells.
+
+        A cell's owner depends on the set of units at the nearest distance from it. A unit appearing in a cell
+        (moved in, spawned) can only change that set for cells no further from it than their previous nearest
+        unit. A unit leaving a cell (moved out, killed) only matters to cells for which it was among the nearest.
+        So the affected cells are those within their previous nearest distance of a changed unit cell.
+        """
+        if self._unit_occ_map is None or self.occupancy_map is None:
+            self._compute_occupancy_grid(occ_map)
+            return
+
+        changed = occ_map != self._unit_occ_map
+        if not changed.any():
+            return  # Same unit cells, same occupancy map
+        if not np.any(occ_map < 4):
+            raise ValueError(f"No units on the map")
+
+        # Cells gaining or losing a unit of some player
+        changed_units = changed & ((occ_map < 4) | (self._unit_occ_map < 4))
+        affected = changed.copy()
+        if changed_units.any():
+            near_idx = scipy.ndimage.distance_transform_edt(~changed_units, return_distances=False,
+                                                            return_indices=True)
+            changed_dist = np.sum((near_idx - self.cell_idx) ** 2, axis=0)
+            affected |= changed_dist <= self._nearest_dist
+
+        unit_cells = np.argwhere(occ_map < 4).astype(np.int32)  # Shape: [S, 2]
+        affected_cells = np.argwhere(affected).astype(np.int32)  # Shape: [A, 2]
+        if affected_cells.shape[0] * unit_cells.shape[0] > self._max_incremental_pairs:
+            self._compute_occupancy_grid(occ_map)
+            return
+
+        # Group unit cells by player
+        unit_players = occ_map[occ_map < 4]
+        order = np.argsort(unit_players, kind="stable")
+        unit_cells = unit_cells[order]
+        player_bounds = np.searchsorted(unit_players[order], np.arange(5))
+
+        # Squared dist from each affected cell to the nearest unit of each player. Shape: [4, A]
+        pair_dist = (affected_cells[:, None, 0] - unit_cells[None, :, 0]) ** 2 + \
+                    (affected_cells[:, None, 1] - unit_cells[None, :, 1]) ** 2  # Shape: [A, S]
+        player_dist = np.full((4, affected_cells.shape[0]), np.iinfo(np.int64).max, dtype=np.int64)
+        for player in range(4):
+            start, end = player_bounds[player], player_bounds[player + 1]
+            if end > start:
+                player_dist[player] = pair_dist[:, start:end].min(axis=1)
+        owner, nearest_dist = self._nearest_owner(player_dist)
+
+        # Cells containing units keep their unit occupancy
+        rows, cols = affected_cells[:, 0], affected_cells[:, 1]
+        unit_occ = occ_map[rows, cols]
+        owner = np.where(unit_occ > 4, owner, unit_occ)
+
+        occ_map_ = self.occupancy_map.copy()
+        occ_map_[rows, cols] = owner
+        self._nearest_dist[rows, cols] = nearest_dist
+        self._unit_occ_map = occ_map
+        self.occupancy_map = occ_map_
+        return
+
+    @staticmethod
+    def _nearest_owner(player_dist) -> tuple[np.ndarray, np.ndarray]:
+        """Owner of each cell from the squared dist to the nearest unit of each player
+
+        Args:
+            player_dist: Shape: [4, ...]. Squared distance to nearest unit of each player.
+
+        Returns:
+            owner: Shape: [...]. 0-3: Player, 4: Disputed (nearest units from multiple players).
+            nearest_dist: Shape: [...]. Squared distance to the nearest unit of any player.
+        """
+        nearest_dist = player_dist.min(axis=0)
+        owner = np.argmin(player_dist, axis=0).astype(np.uint8)
+        owner[np.count_nonzero(player_dist == nearest_dist, axis=0) > 1] = 4  # Nearest units from multiple players
+        return owner, nearest_dist
+
+    def get_player_dist_map(self, unit_occ_map) -> np.ndarray:
+        """Squared distance from each cell to the nearest cell containing a unit of each player
+
+        Args:
+            unit_occ_map: Shape: [N, N]. Cells containing units, as returned by get_unit_occupied_cells().
+                Cells shared by multiple players (4) do not count as a unit of any player.
+
+        Returns:
+            np.ndarray: Shape: [4, N, N]. Exact integer squared distance, in cells. Max int if player has no units.
+        """
+        player_dist = np.full((4, self.map_size, self.map_size), np.iinfo(np.int64).max, dtype=np.int64)
+        for player in range(4):
+            not_unit = unit_occ_map != player
+            if not_unit.all():
+                continue  # Player has no units on the map
+            # Index of the nearest unit cell for each cell. Shape: [2, N, N]
+            near_idx = scipy.ndimage.distance_transform_edt(not_unit, return_distances=False, return_indices=True)
+            player_dist[player] = np.sum((near_idx - self.cell_idx) ** 2, axis=0)
+        return player_dist
+
+    def get_unit_ownership(self, units: UnitState) -> tuple[np.ndarray, np.ndarray]:
+        """Unit owning each cell of the last computed occupancy map, which must be the map of these units.
+        A cell occupied by a player is owned by the player's nearest unit, among the cells counted as that player's
+        units by the occupancy computation. If several are at the same distance, one of them is picked.
+
+        Returns:
+            cell_unit: Shape: [N, N]. Index of the owning unit in units. -1 for disputed cells.
+            unit_cells: Shape: [U,]. Number of cells owned by each unit.
+        """
+        occ_map = self.occupancy_map
+        unit_occ_map = self.get_unit_occupied_cells(units)
+
+        # First unit of each player in each cell. Shape: [4, N, N]
+        no_unit = np.iinfo(np.int32).max
+        player_cell_unit = np.full((4, self.map_size, self.map_size), no_unit, dtype=np.int32)
+        rows, cols = self.get_unit_cells(units)
+        np.minimum.at(player_cell_unit, (units.player, rows, cols), np.arange(units.num_units, dtype=np.int32))
+
+        cell_unit = np.full((self.map_size, self.map_size), -1, dtype=np.int32)
+        for player in range(4):
+            is_owned = occ_map == player
+            if not is_owned.any():
+                continue
+            # Index of the nearest unit cell of the player for each cell. Shape: [2, N, N]
+            near_idx = scipy.ndimage.distance_transform_edt(unit_occ_map != player, return_distances=False,
+                                                            return_indices=True)
+            cell_unit[is_owned] = player_cell_unit[player, near_idx[0][is_owned], near_idx[1][is_owned]]
+
+        unit_cells = np.bincount(cell_unit[cell_unit >= 0], minlength=units.num_units)
+        return cell_unit, unit_cells
+
+    def _filter_disputes(self, occ_map, kdtree, disputed_cell_pts, radius_of_dispute, player_ids):
+        """For each cell with multiple nearby neighbors, resolve dispute
+        Split into a func for profiling
+        """
+        # Find all neighbors within a radius: If all neigh are same player, cell not disputed
+        for disp_cell, radius in zip(disputed_cell_pts, radius_of_dispute):
+            # Radius needs padding to conform to < equality.
+            rad_pad = 1e-5
+            d_near_dist, d_near_idx = kdtree.query(disp_cell,
+                                                   k=self._num_contested_pts_check,
+                                                   distance_upper_bound=radius + rad_pad)
+            # We will get exactly as many points as requested. Extra points will have inf dist
+            # Need to filter those points that are within radius (dist < inf).
+            valid_pts = np.isfinite(d_near_dist)
+            d_near_dist = d_near_dist[valid_pts]
+            d_near_idx = d_near_idx[valid_pts]
+
+            # Additional check - remove those points that are even 1e-5 distance further
+            valid_pts = d_near_dist == d_near_dist[0]
+            d_near_idx = d_near_idx[valid_pts]
+
+            disputed_ids = player_ids[d_near_idx]  # Get player ids of the contesting cells
+            all_same_ids = np.all(disputed_ids == disputed_ids[0])
+            if all_same_ids:
+                # Mark cell belonging to this player
+                player = disputed_ids[0]
+            else:
+                # Mark cell as contested
+                player = 4
+            disp_cell = disp_cell.astype(int)  # Shape: [2,]
+            occ_map[disp_cell[0], disp_cell[1]] = player
+
+        return occ_map
+
+    @staticmethod
+    def _compute_cell_coords(map_size) -> np.ndarray:
+        """Calculates the origin for each cell.
+        Each cell is 1km wide and origin is in the center.
+
+        Return:
+            coords: Shape: [100, 100, 2]. Coords for each cell in grid.
+        """
+        x = np.arange(0.5, map_size, 1.0)
+        y = x
+        xx, yy = np.meshgrid(x, y, indexing="ij")
+        coords = np.stack((xx, yy), axis=-1)
+        return coords
+
+    def get_unit_occupied_cells(self, units: UnitState) -> np.ndarray:
+        """Colculate which cells contain units and are occupied/disputed
+
+        Args:
+            units: Units of a state of the day (init, after unit move, after unit kill).
+
+        Returns:
+            unit_occupancy_map: Shape: [N, N]. Maps cells to players/dispute, before nearest neighbor calculations.
+                0-3: Player. 4: Disputed. 5: Not computed
+        """
+        # Bit p is set if the cell contains a unit of player p
+        players_in_cell = np.zeros((self.map_size, self.map_size), dtype=np.uint8)
+        rows, cols = self.get_unit_cells(units)
+        np.bitwise_or.at(players_in_cell, (rows, cols), np.uint8(1) << units.player.astype(np.uint8))
+
+        occ_map = self.unit_occ_lut[players_in_cell]
+
+        return occ_map
+
+    @staticmethod
+    def get_unit_cells(units: UnitState) -> tuple[np.ndarray, np.ndarray]:
+        """Quantize unit pos to cell idx (row, col) = (int(y), int(x))"""
+        cells = units.pos.astype(int)  # Truncates like int()
+        return cells[:, 1], cells[:, 0]
+
+    def get_connectivity_map(self) -> np.ndarray:
+        """Map of all cells that have a path to their respective home base.
+        Returns:
+            np.ndarray: Connectivity map: Valid cells are marked with the player number,
+                others are set to 4 (disputed). Shape: [N, N]
+        """
+        occ_map = self.occupancy_map
+        if self._connected_occ_map is None:
+            players = np.arange(4)
+            connected = np.full_like(occ_map, 4)  # Default = disputed/empty
+        else:
+            # The cells connected to a player's home base only depend on the cells occupied by that player
+            changed = occ_map != self._connected_occ_map
+            players = np.union1d(occ_map[changed], self._connected_occ_map[changed])
+            players = players[players < 4]
+            connected = self._connectivity_map.copy()
+            connected[np.isin(connected, players)] = 4
+
+        if players.shape[0] > 0:
+            labels = self.label_components(occ_map[None] == players[:, None, None].astype(occ_map.dtype))
+            # Label of the home base component. 0 if player's home base no longer belongs to player
+            home_labels = labels[np.arange(players.shape[0]), self.home_rows[players], self.home_cols[players]]
+            for player, player_labels, home_label in zip(players, labels, home_labels):
+                if home_label > 0:
+                    connected[player_labels == home_label] = player
+
+        self._connected_occ_map = occ_map.copy()
+        self._connectivity_map = connected
+        return connected
+
+    @staticmethod
+    def label_components(masks) -> np.ndarray:
+        """8-connected components of a stack of maps, labelled in a single pass
+
+        Args:
+            masks: Shape: [M, N, N]. Bool maps.
+
+        Returns:
+            np.ndarray: Shape: [M, N, N]. int32 label of the component of each True cell, unique across all maps.
+                0 for False cells.
+        """
+        num_maps, h, w = masks.shape
+        # An empty row below each map keeps components of different maps apart
+        stacked = np.zeros((num_maps, h + 1, w), dtype=np.uint8)
+        stacked[:, :h] = masks
+        _, labels = cv2.connectedComponents(stacked.reshape(num_maps * (h + 1), w), connectivity=8,
+                                            ltype=cv2.CV_32S)
+        return labels.reshape(num_maps, h + 1, w)[:, :h]
+
+    def remove_killed_units(self, units: UnitState, connectivity_map: np.ndarray = None) -> UnitState:
+        """Remove units that have no path to their home base
+        Args:
+            units: Units of the last computed occupancy map
+            connectivity_map: Shape: [N, N]. Output of get_connectivity_map(), computed if not provided.
+
+        Returns:
+            UnitState: Units still alive. Same object if no unit was killed.
+        """
+        if connectivity_map is None:
+            connectivity_map = self.get_connectivity_map()
+
+        rows, cols = self.get_unit_cells(units)
+        alive = connectivity_map[rows, cols] == units.player
+        if alive.all():
+            return units
+        return units.subset(alive)
@@ -0,0 +1,76 @@
+import logging
+import logging.handlers
+import queue
+
+import numpy as np
+
+
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Records stay in this process: leave formatting of the message to the listener thread
+        return record
+
+
+class LogPipeline(logging.handlers.QueueListener):
+    def __init__(self):
+        """Writes log records to their files on a background thread.
+
+        Loggers get queue_handler, which only enqueues records. Formatting messages and writing them happens in the
+        listener thread, with the handlers added to the pipeline, each respecting its own level and filters.
+        """
+        super().__init__(queue.SimpleQueue(), respect_handler_level=True)
+        self.queue_handler = _LocalQueueHandler(self.queue)
+
+    def add_handler(self, handler):
+        """Add a handler, e.g. the log file of a player, while the pipeline is running"""
+        self.handlers = self.handlers + (handler,)
+
+    def stop(self):
+        """Write the remaining records, then close the handlers"""
+        if self._thread is not None:
+            super().stop()
+        for handler in self.handlers:
+            handler.close()
+
+
+class MoveRecorder:
+    columns = ("day", "player", "unit_id", "distance", "angle")
+
+    def __init__(self, path):
+        """Moves received from players, written as a binary columnar file instead of lines of debug.log.
+
+        Each column is an array of a .npz file, with a row per unit per day: day (1-based, as in the logs), player
+        (0-3), unit_id, distance and angle as received. Invalid moves are kept with their non-finite values.
+        Load with np.load(path).
+
+        Args:
+            path: Path of the .npz file
+        """
+        self.path = path
+        self._days = []  # Columns of each recorded (day, player), concatenated on write
+
+    def reset(self):
+        self._days = []
+
+    def record(self, day, player, unit_id, moves):
+        """Add the moves of a player
+
+        Args:
+            day: Day index, 0-based
+            player: Player slot
+            unit_id: Shape: [N,]. Id of each moved unit
+            moves: Shape: [N, 2]. (distance, angle) of each unit
+        """
+        n = len(unit_id)
+        self._days.append((np.full(n, day + 1, dtype=np.int32), np.full(n, player, dtype=np.int8),
+                           np.asarray(unit_id, dtype=np.int32), moves[:, 0].copy(), moves[:, 1].copy()))
+
+    def get_columns(self):
+        """Dict. Column name -> array of all recorded moves"""
+        if not self._days:
+            dtypes = (np.int32, np.int8, np.int32, np.float64, np.float64)
+            return {name: np.zeros(0, dtype=dtype) for name, dtype in zip(self.columns, dtypes)}
+        return {name: np.concatenate(column) for name, column in zip(self.columns, zip(*self._days))}
+
+    def write(self):
+        np.savez_compressed(self.path, **self.get_columns())
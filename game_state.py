@@ -0,0 +1,207 @@
+import collections
+import threading
+from typing import List
+
+import numpy as np
+from shapely.geometry import Point
+
+import constants
+
+
+class UnitState:
+    def __init__(self, pos, player, unit_id):
+        """Units of all players at one state of a day, grouped by player.
+        Arrays are read-only, so states in which no unit changed can share the same UnitState.
+
+        Args:
+            pos: Shape: [U, 2]. Position (x, y) of each unit.
+            player: Shape: [U,]. Player owning each unit. Must be sorted.
+            unit_id: Shape: [U,]. Id of each unit, the number of the spawn that created it.
+        """
+        self.pos = np.asarray(pos, dtype=np.float64).reshape(-1, 2)
+        self.player = np.asarray(player, dtype=np.int8)
+        self.unit_id = np.asarray(unit_id, dtype=np.int32)
+        for arr in (self.pos, self.player, self.unit_id):
+            arr.flags.writeable = False
+
+        # Units of player p are units[offsets[p]:offsets[p + 1]]
+        self.offsets = np.searchsorted(self.player, np.arange(constants.no_of_players + 1))
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 2)), np.zeros(0), np.zeros(0))
+
+    @classmethod
+    def from_points(cls, unit_pos, unit_id=None):
+        """Create from the list format used by players
+
+        Args:
+            unit_pos: List - unit_pos[player][id] - shapely.geometry.Point or (x, y)
+            unit_id: List - unit_id[player][id] - str. If not provided, units of each player are numbered from 1.
+        """
+        pos, player, ids = [], [], []
+        for p, player_pos in enumerate(unit_pos):
+            for j, pt in enumerate(player_pos):
+                pos.append((pt.x, pt.y) if isinstance(pt, Point) else tuple(pt))
+                player.append(p)
+                ids.append(int(unit_id[p][j]) if unit_id is not None else j + 1)
+        return cls(np.array(pos, dtype=np.float64), player, ids)
+
+    @property
+    def num_units(self) -> int:
+        return self.player.shape[0]
+
+    def count(self, player) -> int:
+        return int(self.offsets[player + 1] - self.offsets[player])
+
+    def player_pos(self, player) -> np.ndarray:
+        return self.pos[self.offsets[player]:self.offsets[player + 1]]
+
+    def player_ids(self, player) -> np.ndarray:
+        return self.unit_id[self.offsets[player]:self.offsets[player + 1]]
+
+    def spawn(self, spawn_loc, unit_id):
+        """New units spawned at the home base of each player, added after the player's existing units"""
+        idx = self.offsets[1:]
+        pos = np.insert(self.pos, idx, np.asarray(spawn_loc, dtype=np.float64), axis=0)
+        player = np.insert(self.player, idx, np.arange(constants.no_of_players))
+        ids = np.insert(self.unit_id, idx, unit_id)
+        return UnitState(pos, player, ids)
+
+    def moved(self, pos):
+        """Same units at new positions"""
+        return UnitState(pos, self.player, self.unit_id)
+
+    def subset(self, mask):
+        """Units for which mask is True, e.g. units still alive"""
+        return UnitState(self.pos[mask], self.player[mask], self.unit_id[mask])
+
+    def points(self) -> List[List[Point]]:
+        """Unit positions in the list format used by players: unit_pos[player][id] - shapely.geometry.Point"""
+        return [[Point(x, y) for x, y in self.player_pos(p).tolist()] for p in range(constants.no_of_players)]
+
+    def ids(self) -> List[List[str]]:
+        """Unit ids in the list format used by players: unit_id[player][id] - str"""
+        return [[str(i) for i in self.player_ids(p).tolist()] for p in range(constants.no_of_players)]
+
+
+def get_play_inputs(units: UnitState, map_state, api_version):
+    """Game state given to play() at the start of the day
+
+    Players declare the version of the play() interface they use with an api_version class attribute.
+        1 (default): Nested lists. unit_id[player][id] - str, unit_pos[player][id] - shapely.geometry.Point,
+            map_states[x][y] - int.
+        2: Read-only NumPy arrays, without conversion. unit_id[player] - int array of shape [N,],
+            unit_pos[player] - float array of shape [N, 2] with (x, y) of each unit,
+            map_states - int8 array of shape [100, 100] indexed as map_states[x][y].
+    """
+    if api_version >= 2:
+        map_state = map_state.view()
+        map_state.flags.writeable = False
+        return dict(
+            unit_id=[units.player_ids(i) for i in range(constants.no_of_players)],
+            unit_pos=[units.player_pos(i) for i in range(constants.no_of_players)],
+            map_states=map_state)
+
+    return dict(unit_id=units.ids(), unit_pos=units.points(), map_states=map_state.tolist())
+
+
+class GameState:
+    def __init__(self, last_day, map_size=constants.max_map_dim):
+        """Record of the occupancy maps, scores and units at each state of each day.
+
+        map_states is preallocated as int8 with zeros, so memory pages are only committed once a day is written.
+        Units are stored as arrays, per state. The shapely Points and id strings given to players and the GUI are
+        only materialized when accessed through unit_pos, unit_id or get_state().
+
+        Args:
+            last_day: Total number of days the game goes on for
+            map_size: Width of the map, in km. Each cell is 1km wide.
+        """
+        self.last_day = last_day
+
+        # map_states[day][state][x][y]. -1 is disputed, 1-4 is players.
+        self.map_states = np.zeros((last_day, constants.day_states, map_size, map_size), dtype=np.int8)
+        self.player_score = [[[0 for k in range(constants.no_of_players)] for j in range(constants.day_states)]
+                             for i in range(last_day)]
+        self.player_total_score = [[0 for j in range(constants.no_of_players)] for i in range(last_day)]
+
+        self.units = []  # units[day][state] - UnitState. Days are added as they are recorded.
+        self._init_unit_views()
+
+    def _init_unit_views(self):
+        # Lazy views in the nested list format: unit_pos[day][state][player][id], unit_id[day][state][player][id]
+        self.unit_pos = _UnitView(self, UnitState.points)
+        self.unit_id = _UnitView(self, UnitState.ids)
+        self._cache = collections.OrderedDict()
+        self._cache_size = 8
+        self._cache_lock = threading.Lock()  # The GUI reads states while the game is played on another thread
+
+    def set_units(self, day, state, units: UnitState):
+        while len(self.units) <= day:
+            self.units.append([None for j in range(constants.day_states)])
+        self.units[day][state] = units
+
+    def get_units(self, day, state) -> UnitState:
+        return self.units[day][state]
+
+    def get_state(self, day, state=0):
+        return_dict = dict()
+        return_dict["day"] = day + 1
+        return_dict["day_states"] = constants.day_state_labels[state]
+        return_dict["map_states"] = self.map_states[day][state].tolist()
+        return_dict["player_score"] = self.player_score[day][state]
+        return_dict["player_total_score"] = self.player_total_score[day]
+        return_dict["unit_id"] = self.unit_id[day][state]
+        return_dict["unit_pos"] = self.unit_pos[day][state]
+        return return_dict
+
+    def _materialize(self, day, state, convert):
+        """Convert units of a state to the list format, keeping the most recent conversions"""
+        key = (day, state, convert)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        converted = convert(self.units[day][state])
+        with self._cache_lock:
+            self._cache[key] = converted
+            self._cache.move_to_end(key)
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return converted
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cache"] = collections.OrderedDict()
+        del state["_cache_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache_lock = threading.Lock()
+
+
+class _UnitView:
+    def __init__(self, game_state, convert):
+        self.game_state = game_state
+        self.convert = convert
+
+    def __len__(self):
+        return len(self.game_state.units)
+
+    def __getitem__(self, day):
+        return _DayUnitView(self, day)
+
+
+class _DayUnitView:
+    def __init__(self, unit_view, day):
+        self.unit_view = unit_view
+        self.day = day
+
+    def __len__(self):
+        return constants.day_states
+
+    def __getitem__(self, state):
+        game_state = self.unit_view.game_state
+        return game_state._materialize(self.day, state, self.unit_view.convert)
@@ -1,5 +1,5 @@
 import argparse
-from voronoi_game import VoronoiGame
+from voronoi_game import VoronoiGame, view_replay
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -13,6 +13,8 @@ if __name__ == '__main__':
     parser.add_argument("--address", "-a", type=str, default="127.0.0.1", help="Address")
     parser.add_argument("--no_browser", "-nb", action="store_true", help="Disable browser launching in GUI mode")
     parser.add_argument("--no_gui", "-ng", action="store_true", help="Disable GUI")
+    parser.add_argument("--raster_board", action="store_true", help="Draw the board in the GUI as an image rendered "
+                                                                     "on the server instead of SVG shapes")
     parser.add_argument("--log_path", default="log", help="Directory path to dump log files, filepath if "
                                                           "disable_logging is false")
     parser.add_argument("--disable_logging", action="store_true", help="Disable Logging, log_path becomes path to file")
@@ -21,7 +23,21 @@ if __name__ == '__main__':
     parser.add_argument("--player2", "-p2", default="d", help="Specifying player 2 out of 4")
     parser.add_argument("--player3", "-p3", default="d", help="Specifying player 3 out of 4")
     parser.add_argument("--player4", "-p4", default="d", help="Specifying player 4 out of 4")
-    parser.add_argument("--dump_state", action="store_true", help="Dump game.pkl for rendering")
+    parser.add_argument("--dump_state", action="store_true", help="Record the game to game.replay for rendering")
+    parser.add_argument("--replay", default=None, help="Browse the game recorded in this replay file in the GUI, "
+                                                       "instead of playing one")
+    parser.add_argument("--player_clock", default="cpu", choices=["cpu", "thread", "wall"],
+                        help="Clock charging play() calls to the time budget of players")
+    parser.add_argument("--disable_gc_in_play", action="store_true",
+                        help="Keep the garbage collector disabled during play() calls")
+    parser.add_argument("--sandbox", action="store_true", help="Run each player in its own worker process, with "
+                                                                "concurrent play() calls and hard timeouts")
+    parser.add_argument("--parallel_play", action="store_true", help="Run the play() calls of all players "
+                                                                      "concurrently in threads")
+    parser.add_argument("--move_log", default=None, help="Write the moves received from players to this .npz file "
+                                                         "instead of debug.log")
+    parser.add_argument("--profile", default=None, help="Record the time spent in each phase of each day to this "
+                                                        ".csv or .jsonl file, and print a summary at game end")
     args = parser.parse_args()
     player_list = tuple([args.player1, args.player2, args.player3, args.player4])
     del args.player1
@@ -33,4 +49,7 @@ if __name__ == '__main__':
         if args.log_path == "log":
             args.log_path = "results.log"
     
-    voronoi_game = VoronoiGame(player_list, args)
+    if args.replay is not None:
+        view_replay(args)
+    else:
+        voronoi_game = VoronoiGame(player_list, args)
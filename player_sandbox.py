@@ -0,0 +1,286 @@
+import logging
+import logging.handlers
+import multiprocessing
+import multiprocessing.connection
+import time
+import traceback
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import constants
+from game_state import UnitState, get_play_inputs
+from player_timer import PlayerTimer
+
+
+class SharedDayState:
+    def __init__(self, map_size, max_units, name=None):
+        """Start of day state given to sandboxed players, in a shared memory block written by the game process.
+
+        Args:
+            map_size: Width of the map, in km
+            max_units: Maximum number of units on the map
+            name: Name of an existing block to attach to. Default: create a new block.
+        """
+        self.map_size = map_size
+        self.max_units = max_units
+        layout = [
+            ("header", np.int64, (2,)),  # Day, number of units
+            ("map_state", np.int8, (map_size, map_size)),  # map_states[x][y]
+            ("pos", np.float64, (max_units, 2)),
+            ("unit_id", np.int32, (max_units,)),
+            ("player", np.int8, (max_units,)),
+            ("cell_unit", np.int32, (map_size, map_size)),  # Cell ownership, only written if a player asks for it
+            ("unit_cells", np.int32, (max_units,)),
+        ]
+        offsets, size = [], 0
+        for field, dtype, shape in layout:
+            offsets.append(size)
+            size += -(-np.dtype(dtype).itemsize * int(np.prod(shape)) // 8) * 8  # Keep each field 8-byte aligned
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        for (field, dtype, shape), offset in zip(layout, offsets):
+            setattr(self, field, np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset))
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, day, units: UnitState, map_state, cell_ownership=None):
+        n = units.num_units
+        self.header[:] = day, n
+        self.map_state[:] = map_state
+        self.pos[:n] = units.pos
+        self.unit_id[:n] = units.unit_id
+        self.player[:n] = units.player
+        if cell_ownership is not None:
+            self.cell_unit[:] = cell_ownership["cell_unit"]
+            self.unit_cells[:n] = np.concatenate(cell_ownership["unit_cells"])
+
+    def read_units(self) -> UnitState:
+        n = int(self.header[1])
+        return UnitState(self.pos[:n].copy(), self.player[:n].copy(), self.unit_id[:n].copy())
+
+    def read_cell_ownership(self, units: UnitState):
+        cell_unit = self.cell_unit.copy()
+        cell_unit.flags.writeable = False
+        unit_cells = self.unit_cells[:units.num_units].copy()
+        unit_cells.flags.writeable = False
+        return dict(cell_unit=cell_unit,
+                    unit_cells=[unit_cells[units.offsets[i]:units.offsets[i + 1]]
+                                for i in range(constants.no_of_players)])
+
+    def close(self):
+        # Release views before closing the block
+        for field in ("header", "map_state", "pos", "unit_id", "player", "cell_unit", "unit_cells"):
+            setattr(self, field, None)
+        self.shm.close()
+
+
+class _ForwardHandler(logging.Handler):
+    """Hands log records of sandboxed players to the logger of the same name in the game process"""
+    def emit(self, record):
+        logger = logging.getLogger(record.name)
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+
+
+def _worker_main(conn, shm_name, map_size, max_units, log_queue):
+    """Loop of a worker process hosting one player"""
+    state = SharedDayState(map_size, max_units, name=shm_name)
+    player, timer = None, None
+    try:
+        while True:
+            message = conn.recv()
+            command = message[0]
+            if command == "init":
+                _, player_class, kwargs, logger_name, log_level, clock, disable_gc = message
+                logger = logging.getLogger(logger_name)
+                logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+                logger.propagate = False
+                logger.setLevel(log_level)
+                logger.disabled = log_level > logging.CRITICAL
+                timer = PlayerTimer(1, clock, disable_gc)
+                start_time = time.time()
+                try:
+                    player = player_class(logger=logger, **kwargs)
+                except Exception:
+                    player = None
+                    conn.send(("error", traceback.format_exc()))
+                    continue
+                conn.send(("ok", time.time() - start_time))
+            elif command == "play":
+                _, current_scores, total_scores, with_ownership = message
+                units = state.read_units()
+                play_inputs = get_play_inputs(units, state.map_state, getattr(player, "api_version", 1))
+                if with_ownership:
+                    play_inputs.update(state.read_cell_ownership(units))
+                with timer.time_call(0):
+                    try:
+                        action = player.play(**play_inputs, current_scores=current_scores,
+                                             total_scores=total_scores)
+                    except Exception:
+                        action = None
+                try:
+                    conn.send((action, timer.last_call_time(0)))
+                except Exception:
+                    conn.send((None, timer.last_call_time(0)))  # Action cannot be sent back, e.g. not picklable
+            elif command == "close":
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass  # Game process exited or was interrupted
+    finally:
+        state.close()
+
+
+class PlayerSandbox:
+    def __init__(self, max_units, clock="cpu", disable_gc=False):
+        """Runs each player in its own persistent worker process.
+
+        The start of day state is written once to shared memory, then all players' play() calls run concurrently.
+        The game process enforces wall-clock timeouts: a player that does not answer in time is terminated, so a
+        hung player cannot stall the game. Workers are kept across games and only replaced after a timeout.
+
+        Args:
+            max_units: Maximum number of units on the map
+            clock: Clock charging play() calls to the time budget of players, measured in the worker.
+                See PlayerTimer.clocks.
+            disable_gc: Keep the garbage collector of the worker disabled during play() calls
+        """
+        self.clock = clock
+        self.disable_gc = disable_gc
+        self._context = multiprocessing.get_context("spawn")
+        self.state = SharedDayState(constants.max_map_dim, max_units)
+        self.workers = [None for i in range(constants.no_of_players)]  # (process, connection) of each slot
+        self.player_classes = [None for i in range(constants.no_of_players)]
+
+        # Log records of players are forwarded to the game process loggers
+        self.log_queue = self._context.Queue()
+        self.log_listener = logging.handlers.QueueListener(self.log_queue, _ForwardHandler())
+        self.log_listener.start()
+        self._finalizer = weakref.finalize(self, PlayerSandbox._cleanup, self.workers, self.state, self.log_listener)
+
+        # Workers import their player modules in parallel, while the game sets up
+        for idx in range(constants.no_of_players):
+            self._start_worker(idx)
+
+    def _start_worker(self, idx):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.state.name, self.state.map_size, self.state.max_units,
+                                       self.log_queue),
+            name="player-{}".format(idx + 1), daemon=True)
+        process.start()
+        child_conn.close()
+        self.workers[idx] = (process, parent_conn)
+
+    def _stop_worker(self, idx):
+        process, conn = self.workers[idx]
+        process.terminate()
+        process.join()
+        conn.close()
+        self.workers[idx] = None
+
+    def is_alive(self, idx):
+        return self.workers[idx] is not None
+
+    def init_player(self, idx, player_class, kwargs, logger, timeout=None):
+        """Create the player in the worker of slot idx
+
+        Args:
+            kwargs: Arguments of the player class, except logger
+            logger: Logger of the player in the game process. Records logged by the player are handled by it.
+            timeout: Seconds to wait for the player to be created, None to wait forever
+
+        Returns:
+            (bool, float): Whether the player was created in time, time taken
+        """
+        if self.workers[idx] is None or not self.workers[idx][0].is_alive():
+            self._start_worker(idx)
+        process, conn = self.workers[idx]
+        self.player_classes[idx] = player_class
+
+        log_level = logging.CRITICAL + 1 if logger.disabled else logger.getEffectiveLevel()
+        start_time = time.time()
+        conn.send(("init", player_class, kwargs, logger.name, log_level, self.clock, self.disable_gc))
+        if not conn.poll(timeout):
+            self._stop_worker(idx)
+            return False, time.time() - start_time
+        try:
+            status, result = conn.recv()
+        except (EOFError, OSError):
+            status, result = "error", "Worker process exited"
+        if status != "ok":
+            raise RuntimeError("Failed to create player {} in its worker process:\n{}".format(idx + 1, result))
+        return True, result
+
+    def play(self, day, units: UnitState, map_state, current_scores, total_scores, players, time_left,
+             cell_ownership=None):
+        """Run play() of the given players concurrently
+
+        Args:
+            players: Slots of the players to call
+            time_left: Seconds of wall-clock time each player has to answer
+            cell_ownership: Output of GameEngine.get_cell_ownership(), for players with cell_ownership set
+
+        Returns:
+            Dict. slot -> (action, time charged). action is None if the call failed. Time charged is None if the
+                player did not answer in time or its worker exited: the worker is stopped.
+        """
+        self.state.write(day, units, map_state, cell_ownership)
+        start_time = time.time()
+        pending = dict()
+        for idx in players:
+            process, conn = self.workers[idx]
+            with_ownership = getattr(self.player_classes[idx], "cell_ownership", False)
+            conn.send(("play", current_scores, total_scores, with_ownership))
+            pending[conn] = idx
+
+        results = dict()
+        while pending:
+            deadline = min(start_time + max(time_left[idx], 0) for idx in pending.values())
+            ready = multiprocessing.connection.wait(list(pending), timeout=max(deadline - time.time(), 0))
+            for conn in ready:
+                idx = pending.pop(conn)
+                try:
+                    results[idx] = conn.recv()
+                except (EOFError, OSError):
+                    self._stop_worker(idx)
+                    results[idx] = (None, None)
+            for conn, idx in list(pending.items()):
+                if time.time() >= start_time + max(time_left[idx], 0):
+                    del pending[conn]
+                    self._stop_worker(idx)
+                    results[idx] = (None, None)
+        return results
+
+    def close(self):
+        """Stop the worker processes and release the shared memory"""
+        self._finalizer()
+
+    @staticmethod
+    def _cleanup(workers, state, log_listener):
+        for worker in workers:
+            if worker is None:
+                continue
+            try:
+                worker[1].send(("close",))
+            except (OSError, ValueError):
+                pass
+        for idx, worker in enumerate(workers):
+            if worker is None:
+                continue
+            process, conn = worker
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            conn.close()
+            workers[idx] = None
+        log_listener.stop()
+        state.close()
+        state.shm.unlink()
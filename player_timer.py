@@ -0,0 +1,94 @@
+import contextlib
+import gc
+import threading
+import time
+
+import numpy as np
+
+
+class PlayerTimer:
+    clocks = {
+        "cpu": time.process_time,  # CPU time of all threads of the process, not of child processes
+        "thread": time.thread_time,  # CPU time of the calling thread only
+        "wall": time.perf_counter,
+    }
+
+    def __init__(self, num_players, clock="cpu", disable_gc=False):
+        """Time charged to each player for its play() calls, with the latency of each call.
+
+        Args:
+            num_players: Number of player slots
+            clock: "cpu" (default), "thread" or "wall". CPU clocks only charge time the player spends computing,
+                not time the process is descheduled or waiting.
+            disable_gc: Keep the garbage collector disabled during play() calls. Collections triggered by the
+                engine's allocations then run after the call, instead of being charged to the player.
+        """
+        if clock not in self.clocks:
+            raise ValueError("Unknown clock {}, choose from {}".format(clock, list(self.clocks)))
+        self.clock = clock
+        self.disable_gc = disable_gc
+        self._time = self.clocks[clock]
+        self.num_players = num_players
+        self.call_times = [[] for i in range(num_players)]  # Time of each play() call of each player
+
+        # Calls may run concurrently in threads: the garbage collector is re-enabled when the last one ends
+        self._lock = threading.Lock()
+        self._active_calls = 0
+        self._gc_was_enabled = False
+
+    def reset(self):
+        self.call_times = [[] for i in range(self.num_players)]
+
+    @contextlib.contextmanager
+    def time_call(self, idx):
+        """Time the enclosed play() call of player idx"""
+        if self.disable_gc:
+            with self._lock:
+                if self._active_calls == 0:
+                    self._gc_was_enabled = gc.isenabled()
+                    gc.disable()
+                self._active_calls += 1
+        start = self._time()
+        try:
+            yield
+        finally:
+            self.call_times[idx].append(self._time() - start)
+            if self.disable_gc:
+                with self._lock:
+                    self._active_calls -= 1
+                    if self._active_calls == 0 and self._gc_was_enabled:
+                        gc.enable()
+
+    def add_call_time(self, idx, seconds):
+        """Record a call timed elsewhere, e.g. in a worker process"""
+        self.call_times[idx].append(seconds)
+
+    def last_call_time(self, idx) -> float:
+        return self.call_times[idx][-1]
+
+    def get_latency_stats(self):
+        """Per-call latency of each player, in seconds
+
+        Returns:
+            List. For each player, dict with calls, total, p50, p95 and max. None for players never called.
+        """
+        stats = []
+        for call_times in self.call_times:
+            if not call_times:
+                stats.append(None)
+                continue
+            p50, p95 = np.percentile(call_times, [50, 95])
+            stats.append({"calls": len(call_times), "total": float(np.sum(call_times)), "p50": float(p50),
+                          "p95": float(p95), "max": float(np.max(call_times))})
+        return stats
+
+    def summary(self, player_names):
+        lines = ["{:<24} {:>6} {:>10} {:>10} {:>10} {:>10}".format(
+            "Player ({} time)".format(self.clock), "Calls", "Total (s)", "p50 (ms)", "p95 (ms)", "Max (ms)")]
+        for name, stats in zip(player_names, self.get_latency_stats()):
+            if stats is None:
+                lines.append("{:<24} {:>6}".format(name, 0))
+                continue
+            lines.append("{:<24} {:>6} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+                name, stats["calls"], stats["total"], 1000 * stats["p50"], 1000 * stats["p95"], 1000 * stats["max"]))
+        return "\n".join(lines)
@@ -7,6 +7,8 @@ import shapely.geometry
 
 
 class Player:
+    api_version = 2  # play() receives NumPy arrays, see GameEngine.get_play_inputs()
+
     def __init__(self, rng: np.random.Generator, logger: logging.Logger, total_days: int, spawn_days: int,
                  player_idx: int, spawn_point: shapely.geometry.Point, min_dim: int, max_dim: int, precomp_dir: str) \
             -> None:
@@ -47,11 +49,11 @@ class Player:
         """Function which based on current game state returns the distance and angle of each unit active on the board
 
                 Args:
-                    unit_id (list(list(str))): contains the ids of each player's units (unit_id[player_idx][x])
-                    unit_pos (list(list(shapely.geometry.Point))): contains the position of each unit currently present
-                                                    on the map (unit_pos[player_idx][x])
-                    map_states (list(list(int)): contains the state of each cell, using the x, y coordinate system
-                                                    (map_states[x][y])
+                    unit_id (list(np.ndarray)): contains the ids of each player's units (unit_id[player_idx][x])
+                    unit_pos (list(np.ndarray)): contains the position (x, y) of each unit currently present
+                                                    on the map, Shape: [N, 2] (unit_pos[player_idx][x])
+                    map_states (np.ndarray): read-only int8 array containing the state of each cell, using the x, y
+                                                    coordinate system (map_states[x][y])
                     current_scores (list(int)): contains the number of cells currently occupied by each player
                                                     (current_scores[player_idx])
                     total_scores (list(int)): contains the cumulative scores up until the current day
@@ -64,13 +66,14 @@ class Player:
 
         moves = []
         for i in range(len(unit_id[self.player_idx])):
+            x, y = unit_pos[self.player_idx][i]
             if self.player_idx == 0:
-                distance = min(1, 100 - unit_pos[self.player_idx][i].x)
-                angle = np.arctan2(100 - unit_pos[self.player_idx][i].y, 100 - unit_pos[self.player_idx][i].x)
+                distance = min(1, 100 - x)
+                angle = np.arctan2(100 - y, 100 - x)
                 moves.append((distance, angle))
             elif self.player_idx == 1:
-                distance = min(1, 100 - unit_pos[self.player_idx][i].x)
-                angle = np.arctan2(0.5 - unit_pos[self.player_idx][i].y, 0.5 - unit_pos[self.player_idx][i].x)
+                distance = min(1, 100 - x)
+                angle = np.arctan2(0.5 - y, 0.5 - x)
                 moves.append((distance, angle))
             elif self.player_idx == 2:
                 distance = min(1.0, self.rng.random())
@@ -0,0 +1,108 @@
+import contextlib
+import csv
+import json
+import time
+
+
+class DayProfiler:
+    def __init__(self, phases=()):
+        """Per-day timings of the phases of the game engine, with unit and dispute counts.
+
+        Each day is a row. A phase adds two columns: <phase>_wall and <phase>_cpu, in seconds, summed if the phase
+        runs several times in a day. Phases that did not run on a day are left empty.
+
+        Args:
+            phases: Order of the phases in exports and summary. Other phases come after, in the order they first ran.
+        """
+        self.phases = list(phases)
+        self.rows = []
+        self._row = None
+
+    def reset(self):
+        """Forget recorded days, before starting a new game"""
+        self.rows = []
+        self._row = None
+
+    def start_day(self, day):
+        self._row = {"day": day + 1}
+        self.rows.append(self._row)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time the enclosed code as a phase of the current day"""
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall_key, cpu_key = "{}_wall".format(name), "{}_cpu".format(name)
+            self._row[wall_key] = self._row.get(wall_key, 0.0) + time.perf_counter() - start_wall
+            self._row[cpu_key] = self._row.get(cpu_key, 0.0) + time.process_time() - start_cpu
+
+    def record(self, **values):
+        """Add counts to the current day"""
+        self._row.update(values)
+
+    def get_phases(self):
+        """Phases that ran on any day"""
+        ran = []
+        for row in self.rows:
+            ran.extend(key[:-len("_wall")] for key in row if key.endswith("_wall") and key[:-len("_wall")] not in ran)
+        return [phase for phase in self.phases if phase in ran] + [phase for phase in ran if phase not in self.phases]
+
+    def get_columns(self):
+        """Day, then the time columns of each phase, then counts"""
+        columns = ["day"]
+        for phase in self.get_phases():
+            columns += ["{}_wall".format(phase), "{}_cpu".format(phase)]
+        for row in self.rows:
+            columns.extend(key for key in row if key not in columns)
+        return columns
+
+    def get_phase_totals(self):
+        """Total wall and cpu time of each phase over all days
+
+        Returns:
+            Dict. phase -> (wall, cpu, number of days the phase ran)
+        """
+        totals = dict()
+        for phase in self.get_phases():
+            wall_key, cpu_key = "{}_wall".format(phase), "{}_cpu".format(phase)
+            days = [row for row in self.rows if wall_key in row]
+            totals[phase] = (sum(row[wall_key] for row in days), sum(row[cpu_key] for row in days), len(days))
+        return totals
+
+    def write(self, path):
+        """Export the rows to a .csv file, or a JSON lines file for any other extension"""
+        with open(path, "w", newline="") as f:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames=self.get_columns(), restval="")
+                writer.writeheader()
+                writer.writerows(self.rows)
+            else:
+                for row in self.rows:
+                    f.write(json.dumps(row) + "\n")
+
+    def summary(self, phase_labels=None):
+        """Table of the time spent in each phase over the game
+
+        Args:
+            phase_labels: Dict. Optional display name of phases, e.g. player names for the play phases.
+        """
+        phase_labels = phase_labels or dict()
+        totals = self.get_phase_totals()
+        total_wall = sum(wall for wall, cpu, days in totals.values())
+        lines = ["{:<24} {:>10} {:>10} {:>12} {:>7}".format("Phase", "Wall (s)", "CPU (s)", "Per day (ms)", "Share")]
+        for phase, (wall, cpu, days) in totals.items():
+            share = 100 * wall / total_wall if total_wall else 0
+            lines.append("{:<24} {:>10.3f} {:>10.3f} {:>12.3f} {:>6.1f}%".format(
+                phase_labels.get(phase, phase), wall, cpu, 1000 * wall / days, share))
+        lines.append("{:<24} {:>10.3f}".format("Total", total_wall))
+
+        time_columns = {"day"} | {"{}_{}".format(phase, kind) for phase in totals for kind in ("wall", "cpu")}
+        count_columns = [column for column in self.get_columns() if column not in time_columns]
+        if count_columns:
+            lines.append("\n{:<24} {:>10} {:>10}".format("Count", "Total", "Per day"))
+            for column in count_columns:
+                total = sum(row.get(column, 0) for row in self.rows)
+                lines.append("{:<24} {:>10} {:>10.1f}".format(column, total, total / len(self.rows)))
+        return "\n".join(lines)
@@ -1,107 +1,225 @@
+import argparse
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from os import makedirs, remove
+
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 from matplotlib import colors
+import cv2
 import numpy as np
-import pickle
-from os import makedirs, remove
-from glob import glob
 
-from constants import player_color, tile_color, dispute_color, base
+from constants import player_color, tile_color, dispute_color, base, no_of_players
+from replay import ReplayReader
+from voronoi_renderer import VoronoiRender
+
+DAY_STATE = 2
 
-with open("game.pkl", "rb") as f:
-    game_data = pickle.load(f)
 
-makedirs("render", exist_ok=True)
+class FrameRenderer:
+    def __init__(self, replay_path, out_dir="render"):
+        """Draws the frames of a replay. One figure is built once, then each frame only updates the data of its
+        artists: occupancy mesh, unit markers, scores and title.
 
-old_files = glob("render/*.png")
-for f in old_files:
-    remove(f)
+        Args:
+            replay_path: Path of the replay file
+            out_dir: Directory of the frames, <day>.png with day 0 the start of the game
+        """
+        self.replay = ReplayReader(replay_path)
+        self.out_dir = out_dir
 
-DAY_STATE = 2
-for day in range(-1, len(game_data["map_states"])):
-    plt.clf()
-    plt.title(f"Day {day + 1} - (t = {game_data['last_day']}, n = {game_data['spawn_day']})")
-    ax = plt.gca()
-
-    cmap = colors.ListedColormap([dispute_color] + tile_color)
-    bounds = [-1, 1, 2, 3, 4, 5]
-    norm = colors.BoundaryNorm(bounds, cmap.N)
-    X, Y = np.meshgrid(list(range(100)), list(range(100)))
-    if day == -1:
-        plt.pcolormesh(
-            X + 0.5,
-            Y + 0.5,
-            np.transpose(game_data["map_states"][0][0]),
-            cmap=cmap,
-            norm=norm,
-        )
-    else:
-        plt.pcolormesh(
-            X + 0.5,
-            Y + 0.5,
-            np.transpose(game_data["map_states"][day][DAY_STATE]),
-            cmap=cmap,
-            norm=norm,
-        )
+        self.fig = plt.figure()
+        ax = self.fig.gca()
+        self.title = ax.set_title("")
+
+        cmap = colors.ListedColormap([dispute_color] + tile_color)
+        bounds = [-1, 1, 2, 3, 4, 5]
+        norm = colors.BoundaryNorm(bounds, cmap.N)
+        X, Y = np.meshgrid(list(range(100)), list(range(100)))
+        self.mesh = ax.pcolormesh(X + 0.5, Y + 0.5, np.zeros((100, 100)), cmap=cmap, norm=norm)
 
-    # Bases
-    for p in range(4):
-        base_x, base_y = base[p]
-        plt.plot(
-            base_x,
-            base_y,
-            color=player_color[p],
-            marker="s",
-            markeredgecolor="black",
+        # Bases
+        for p in range(4):
+            base_x, base_y = base[p]
+            ax.plot(base_x, base_y, color=player_color[p], marker="s", markeredgecolor="black")
+
+        # Units, all players in one collection
+        self.unit_colors = colors.to_rgba_array(player_color)
+        self.units = ax.scatter([], [], s=16, edgecolors="black", linewidths=1, zorder=3)
+
+        ax.set_xticks(np.arange(0, 100, 10))
+        ax.set_yticks(np.arange(0, 100, 10))
+        ax.grid(color="black", alpha=0.1)
+        ax.set_xticklabels([])
+        ax.set_yticklabels([])
+        ax.xaxis.set_ticks_position("none")
+        ax.yaxis.set_ticks_position("none")
+
+        ax.set_aspect(1)
+        ax.set_xlim([0, 100])
+        ax.set_ylim([0, 100])
+        ax.invert_yaxis()
+
+        self.table = ax.table(
+            cellText=[[""] * 4, [""] * 4],
+            rowLabels=['Score', 'Total Score'],
+            colLabels=self.replay.player_names,
+            colColours=tile_color
         )
+        # The table fits its font size to the cells on the first draw, draw once so all frames get the same layout
+        self.fig.canvas.draw()
 
-    # Units
-    for p in range(4):
+    def draw(self, day):
+        """Save the frame of a day, day -1 being the start of the game"""
         if day == -1:
-            for point in game_data["unit_pos"][0][0][p]:
-                plt.plot(
-                    point.x,
-                    point.y,
-                    color=player_color[p],
-                    marker="o",
-                    markersize=4,
-                    markeredgecolor="black",
-                )
+            map_state, units = self.replay.map_states[0][0], self.replay.get_units(0, 0)
+            cell_values = [self.replay.player_score[0][0], [0 for i in range(4)]]
         else:
-            for point in game_data["unit_pos"][day][DAY_STATE][p]:
-                plt.plot(
-                    point.x,
-                    point.y,
-                    color=player_color[p],
-                    marker="o",
-                    markersize=4,
-                    markeredgecolor="black",
-                )
-
-
-    plt.xticks(np.arange(0, 100, 10))
-    plt.yticks(np.arange(0, 100, 10))
-    plt.grid(color="black", alpha=0.1)
-    ax.set_xticklabels([])
-    ax.set_yticklabels([])
-    ax.xaxis.set_ticks_position("none")
-    ax.yaxis.set_ticks_position("none")
-
-    ax.set_aspect(1)
-    ax.set_xlim([0, 100])
-    ax.set_ylim([0, 100])
-    ax.invert_yaxis()
-
-    if day == -1:
-        cell_values = [game_data["player_score"][0][0], [0 for i in range(4)]]
-    else:
-        cell_values = [game_data["player_score"][day][DAY_STATE], game_data["player_total_score"][day]]
+            map_state, units = self.replay.map_states[day][DAY_STATE], self.replay.get_units(day, DAY_STATE)
+            cell_values = [self.replay.player_score[day][DAY_STATE], self.replay.player_total_score[day]]
+
+        self.title.set_text(f"Day {day + 1} - (t = {self.replay.last_day}, n = {self.replay.spawn_day})")
+        self.mesh.set_array(np.transpose(map_state))
+        self.units.set_offsets(units.pos)
+        self.units.set_facecolors(self.unit_colors[units.player])
+        for row, values in enumerate(cell_values):
+            for col, value in enumerate(values):
+                self.table[row + 1, col].get_text().set_text(str(value))
 
+        self.fig.savefig(os.path.join(self.out_dir, f"{day + 1}.png"))
 
-    plt.table(
-        cellText=cell_values,
-        rowLabels=['Score', 'Total Score'],
-        colLabels=game_data["player_names"],
-        colColours=tile_color
-    )
 
-    plt.savefig(f"render/{day+1}.png")
+class OccupancyFrameRenderer:
+    def __init__(self, replay_path, scale_px=8):
+        """Builds video frames of a replay straight from its occupancy maps, with VoronoiRender: one colored cell
+        per map cell, upsampled, with the units drawn on top. Frames are RGB arrays, nothing is written to disk.
+
+        Args:
+            replay_path: Path of the replay file
+            scale_px: Width of a cell in pixels
+        """
+        self.replay = ReplayReader(replay_path)
+        self.renderer = VoronoiRender(self.replay.metadata["map_size"], scale_px=scale_px,
+                                      unit_px=max(1, scale_px // 2))
+
+    def draw(self, day):
+        """RGB image of a day, day -1 being the start of the game. Shape: [H, W, 3]."""
+        if day == -1:
+            map_state, units = self.replay.map_states[0][0], self.replay.get_units(0, 0)
+        else:
+            map_state, units = self.replay.map_states[day][DAY_STATE], self.replay.get_units(day, DAY_STATE)
+        unit_pos = [units.player_pos(player) for player in range(no_of_players)]
+        return self.renderer.get_colored_occ_map(VoronoiRender.get_occ_map(map_state), unit_pos)
+
+
+_renderer = None  # FrameRenderer or OccupancyFrameRenderer of the worker process
+
+
+def _init_worker(renderer_cls, *args):
+    global _renderer
+    _renderer = renderer_cls(*args)
+
+
+def _render_days(days):
+    for day in days:
+        _renderer.draw(day)
+    return len(days)
+
+
+def _render_video_frames(days):
+    # Frames of the days, in BGR as expected by cv2.VideoWriter. Shape: [len(days), H, W, 3].
+    return np.stack([_renderer.draw(day)[:, :, ::-1] for day in days])
+
+
+def get_chunk_shards(replay_path):
+    """Days of each chunk of a replay, in order. Day -1, the start of the game, goes with the first chunk.
+
+    A worker rendering a whole chunk decompresses it once, and no other worker needs it.
+    """
+    replay = ReplayReader(replay_path)
+    first_days = [first_day for first_day, offset, size in replay.index] + [replay.num_days]
+    replay.close()
+    shards = [list(range(first_days[i], first_days[i + 1])) for i in range(len(first_days) - 1)]
+    if shards:
+        shards[0].insert(0, -1)
+    return shards
+
+
+def render(replay_path="game.replay", out_dir="render", workers=None):
+    """Render all frames of a replay, with days sharded across a pool of processes.
+
+    Each shard is one chunk of the replay, so each chunk is decompressed by a single worker, once.
+    """
+    makedirs(out_dir, exist_ok=True)
+    for f in glob(os.path.join(out_dir, "*.png")):
+        remove(f)
+
+    shards = get_chunk_shards(replay_path)
+    num_frames = sum(len(shard) for shard in shards)
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(FrameRenderer, replay_path, out_dir)) as pool:
+        rendered = 0
+        for count in pool.map(_render_days, shards):
+            rendered += count
+            print("Rendered {}/{} frames".format(rendered, num_frames))
+
+
+def render_video(replay_path="game.replay", video_path="game.mp4", workers=None, fps=20, scale_px=8):
+    """Encode a replay to a video, without writing frames to disk.
+
+    Workers render the days of a chunk of the replay at a time, from its occupancy maps. The frames of each chunk are
+    written to the video as soon as the chunks before it are done. At most 2 chunks per worker are pending, so
+    memory does not grow with the length of the game.
+
+    Args:
+        replay_path: Path of the replay file
+        video_path: Path of the video, encoded with MPEG-4
+        workers: Number of rendering processes, default: one per CPU
+        fps: Frames per second, one frame per day
+        scale_px: Width of a cell in pixels
+    """
+    replay = ReplayReader(replay_path)
+    map_size = replay.metadata["map_size"]
+    replay.close()
+    workers = workers or os.cpu_count()
+    shards = get_chunk_shards(replay_path)
+    num_frames = sum(len(shard) for shard in shards)
+
+    size = map_size * scale_px
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (size, size))
+    if not writer.isOpened():
+        raise RuntimeError("Could not open video writer for {}".format(video_path))
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(OccupancyFrameRenderer, replay_path, scale_px)) as pool:
+            pending, rendered = collections.deque(), 0
+            for i, shard in enumerate(shards):
+                pending.append(pool.submit(_render_video_frames, shard))
+                while pending and (len(pending) >= 2 * workers or i == len(shards) - 1):
+                    frames = pending.popleft().result()
+                    for frame in frames:
+                        writer.write(frame)
+                    rendered += len(frames)
+                    print("Encoded {}/{} frames".format(rendered, num_frames))
+    finally:
+        writer.release()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay", default="game.replay", help="Replay recorded with --dump_state")
+    parser.add_argument("--out", default="render", help="Directory of the frames")
+    parser.add_argument("--workers", type=int, default=None, help="Number of rendering processes, default: one per "
+                                                                  "CPU")
+    parser.add_argument("--video", default=None, help="Encode the game to this video file instead of writing frames")
+    parser.add_argument("--fps", type=int, default=20, help="Frames per second of the video")
+    parser.add_argument("--scale", type=int, default=8, help="Width of a cell in pixels in the video")
+    args = parser.parse_args()
+    if args.video:
+        render_video(args.replay, args.video, args.workers, args.fps, args.scale)
+    else:
+        render(args.replay, args.out, args.workers)
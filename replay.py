@@ -0,0 +1,290 @@
+import collections
+import json
+import mmap
+import struct
+import zlib
+
+import numpy as np
+
+import constants
+from game_state import GameState, UnitState
+
+MAGIC = b"VRPL"
+VERSION = 2
+
+# File layout, little endian:
+#   MAGIC, version (uint32), metadata size (uint32), metadata (JSON)
+#   Chunks, each: first day (uint32), number of days (uint32), data size (uint32), zlib compressed days
+#   Index: first day, offset, size (uint32, uint64, uint32) of each chunk
+#   Footer: index offset (uint64), number of chunks (uint32), MAGIC
+# Each day holds its 3 states: map (int8, XOR of the previous state's map), number of units (uint32), then
+# pos (float64 [U, 2]), player (int8 [U]) and unit_id (int32 [U]). Then scores (int32 [3, 4]), total
+# scores (int32 [4]) and timeout days (int32 [4]). The first state of a chunk is XORed with an empty map, so
+# chunks decode on their own.
+_CHUNK = struct.Struct("<III")
+_INDEX_ENTRY = struct.Struct("<IQI")
+_FOOTER = struct.Struct("<QI4s")
+_SAME_UNITS = 0xFFFFFFFF  # Number of units of a state with the same units as the previous state
+
+
+class ReplayWriter:
+    def __init__(self, path, player_names, last_day, spawn_day, chunk_days=16, compress_level=6):
+        """Streams a game to a replay file, appending each day as it completes.
+
+        Days are grouped in zlib compressed chunks, indexed by day at the end of the file, so readers can seek to
+        any day and only decompress its chunk. See ReplayReader and iter_replay().
+
+        Args:
+            path: Path of the replay file
+            player_names: Name of the player in each slot
+            last_day: Total number of days of the game
+            spawn_day: Number of days after which a unit spawns
+            chunk_days: Number of days compressed together
+            compress_level: zlib compression level
+        """
+        self.path = path
+        self.chunk_days = chunk_days
+        self.compress_level = compress_level
+        self.metadata = {"player_names": list(player_names), "last_day": last_day, "spawn_day": spawn_day,
+                         "map_size": constants.max_map_dim, "day_states": constants.day_states}
+        self.index = []  # (first day, offset, size) of each chunk written
+        self._days = []  # Encoded days of the current chunk
+        self._first_day = 0
+        self._prev_map = None
+
+        self._file = open(path, "wb")
+        metadata = json.dumps(self.metadata).encode()
+        self._file.write(MAGIC + struct.pack("<II", VERSION, len(metadata)) + metadata)
+
+    def write_day(self, day, map_states, units, player_score, player_total_score, player_timeout_day):
+        """Append a day. Days must be written in order.
+
+        Args:
+            day: Day index, 0-based
+            map_states: Shape: [3, N, N]. Map of each state of the day, indexed as map_states[state][x][y].
+            units: UnitState of each state of the day
+            player_score: player_score[state][player]
+            player_total_score: player_total_score[player]
+            player_timeout_day: Day each player timed out on, 0 if it did not
+        """
+        if not self._days:
+            self._first_day = day
+            self._prev_map = np.zeros_like(map_states[0])
+        parts = []
+        for state in range(constants.day_states):
+            parts.append(np.bitwise_xor(map_states[state], self._prev_map).tobytes())
+            self._prev_map = map_states[state]
+            if state > 0 and units[state] is units[state - 1]:
+                parts.append(struct.pack("<I", _SAME_UNITS))
+                continue
+            parts.append(struct.pack("<I", units[state].num_units))
+            parts.append(units[state].pos.astype(np.float64).tobytes())
+            parts.append(units[state].player.tobytes())
+            parts.append(units[state].unit_id.tobytes())
+        parts.append(np.asarray(player_score, dtype=np.int32).tobytes())
+        parts.append(np.asarray(player_total_score, dtype=np.int32).tobytes())
+        parts.append(np.asarray(player_timeout_day, dtype=np.int32).tobytes())
+        self._prev_map = self._prev_map.copy()
+        self._days.append(b"".join(parts))
+        if len(self._days) == self.chunk_days:
+            self.flush()
+
+    def flush(self):
+        """Write the days of the current chunk"""
+        if not self._days:
+            return
+        data = zlib.compress(b"".join(self._days), self.compress_level)
+        offset = self._file.tell()
+        self._file.write(_CHUNK.pack(self._first_day, len(self._days), len(data)))
+        self._file.write(data)
+        self._file.flush()
+        self.index.append((self._first_day, offset, _CHUNK.size + len(data)))
+        self._days = []
+
+    def close(self):
+        """Write the last chunk and the day index"""
+        if self._file.closed:
+            return
+        self.flush()
+        index_offset = self._file.tell()
+        for entry in self.index:
+            self._file.write(_INDEX_ENTRY.pack(*entry))
+        self._file.write(_FOOTER.pack(index_offset, len(self.index), MAGIC))
+        self._file.close()
+
+
+def read_header(buf):
+    """Metadata of a replay and the offset of its first chunk
+
+    Args:
+        buf: Start of the replay file, bytes-like
+    """
+    if bytes(buf[:4]) != MAGIC:
+        raise ValueError("Not a replay file")
+    version, size = struct.unpack_from("<II", buf, 4)
+    if version != VERSION:
+        raise ValueError("Unsupported replay version {}".format(version))
+    return json.loads(bytes(buf[12:12 + size])), 12 + size
+
+
+def read_index(buf, start):
+    """(first day, offset, size) of each chunk. Rebuilt by scanning the chunks if the index was not written,
+    e.g. for a game that is still running or was interrupted."""
+    if len(buf) >= start + _FOOTER.size:
+        index_offset, n_chunks, magic = _FOOTER.unpack_from(buf, len(buf) - _FOOTER.size)
+        if magic == MAGIC:
+            return [_INDEX_ENTRY.unpack_from(buf, index_offset + i * _INDEX_ENTRY.size) for i in range(n_chunks)]
+
+    index, offset = [], start
+    while offset + _CHUNK.size <= len(buf):
+        first_day, n_days, size = _CHUNK.unpack_from(buf, offset)
+        if offset + _CHUNK.size + size > len(buf):
+            break  # Partly written chunk
+        index.append((first_day, offset, _CHUNK.size + size))
+        offset += _CHUNK.size + size
+    return index
+
+
+def decode_chunk(buf, offset, metadata):
+    """Days of the chunk at offset
+
+    Returns:
+        List. For each day of the chunk, dict with day (0-based), map_states (int8 array of shape [3, N, N]),
+            units (UnitState of each state), player_score ([3][4]), player_total_score ([4]) and
+            player_timeout_day ([4]).
+    """
+    first_day, n_days, size = _CHUNK.unpack_from(buf, offset)
+    data = zlib.decompress(buf[offset + _CHUNK.size:offset + _CHUNK.size + size])
+    map_size, day_states = metadata["map_size"], metadata["day_states"]
+    map_cells = map_size * map_size
+    days, pos, prev_map = [], 0, np.zeros((map_size, map_size), dtype=np.int8)
+    for day in range(first_day, first_day + n_days):
+        map_states = np.empty((day_states, map_size, map_size), dtype=np.int8)
+        units = []
+        for state in range(day_states):
+            delta = np.frombuffer(data, dtype=np.int8, count=map_cells, offset=pos).reshape(map_size, map_size)
+            np.bitwise_xor(prev_map, delta, out=map_states[state])
+            prev_map = map_states[state]
+            pos += map_cells
+            n, = struct.unpack_from("<I", data, pos)
+            pos += 4
+            if n == _SAME_UNITS:
+                units.append(units[-1])
+                continue
+            unit_pos = np.frombuffer(data, dtype=np.float64, count=2 * n, offset=pos).reshape(n, 2)
+            player = np.frombuffer(data, dtype=np.int8, count=n, offset=pos + 16 * n)
+            unit_id = np.frombuffer(data, dtype=np.int32, count=n, offset=pos + 17 * n)
+            pos += 21 * n
+            units.append(UnitState(unit_pos, player, unit_id))
+        scores = np.frombuffer(data, dtype=np.int32, count=(day_states + 2) * constants.no_of_players, offset=pos)
+        pos += scores.nbytes
+        scores = scores.reshape(day_states + 2, constants.no_of_players).tolist()
+        days.append({"day": day, "map_states": map_states, "units": units, "player_score": scores[:day_states],
+                     "player_total_score": scores[day_states], "player_timeout_day": scores[day_states + 1]})
+    return days
+
+
+def iter_replay(path):
+    """Read a replay file a chunk at a time. The file is memory-mapped, only the chunk being read is decompressed.
+
+    Returns:
+        (dict, generator): Metadata of the game, days as returned by decode_chunk(), in order.
+    """
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    metadata, start = read_header(buf)
+
+    def days():
+        try:
+            for first_day, offset, size in read_index(buf, start):
+                yield from decode_chunk(buf, offset, metadata)
+        finally:
+            buf.close()
+
+    return metadata, days()
+
+
+class ReplayReader(GameState):
+    def __init__(self, path, cache_chunks=4):
+        """Random access to the days of a replay file, without loading it.
+
+        The file is memory-mapped. Accessing a day finds its chunk in O(1) and decompresses it, keeping the most
+        recently used chunks. Exposes the same fields as the game: map_states[day][state][x][y],
+        player_score[day][state][player], player_total_score[day][player], unit_pos and unit_id[day][state][player][id],
+        get_state(), so it can stand in for a VoronoiGame in the GUI and renderers.
+
+        Args:
+            path: Path of the replay file
+            cache_chunks: Number of decompressed chunks kept
+        """
+        with open(path, "rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.metadata, start = read_header(self._buf)
+        self.index = read_index(self._buf, start)
+        self.player_names = self.metadata["player_names"]
+        self.last_day = self.metadata["last_day"]
+        self.spawn_day = self.metadata["spawn_day"]
+
+        # Chunk of each recorded day
+        chunk_days = [_CHUNK.unpack_from(self._buf, offset)[1] for first_day, offset, size in self.index]
+        self._day_chunk = np.repeat(np.arange(len(self.index)), chunk_days)
+        self.num_days = len(self._day_chunk)
+        self._chunks = collections.OrderedDict()
+        self._cache_chunks = cache_chunks
+
+        self.map_states = _ReplayView(self, "map_states")
+        self.player_score = _ReplayView(self, "player_score")
+        self.player_total_score = _ReplayView(self, "player_total_score")
+        self.units = _ReplayView(self, "units")
+        self._init_unit_views()
+        self.voronoi_app = None
+
+    def get_day(self, day):
+        """Recorded day, as returned by decode_chunk()"""
+        if day < 0:
+            day += self.num_days
+        if not 0 <= day < self.num_days:
+            raise IndexError("Day {} not in replay of {} days".format(day, self.num_days))
+        chunk = int(self._day_chunk[day])
+        if chunk in self._chunks:
+            self._chunks.move_to_end(chunk)
+        else:
+            self._chunks[chunk] = decode_chunk(self._buf, self.index[chunk][1], self.metadata)
+            if len(self._chunks) > self._cache_chunks:
+                self._chunks.popitem(last=False)
+        return self._chunks[chunk][day - self.index[chunk][0]]
+
+    def set_units(self, day, state, units: UnitState):
+        raise TypeError("Replays are read-only")
+
+    def get_units(self, day, state) -> UnitState:
+        return self.get_day(day)["units"][state]
+
+    def get_state(self, day, state=0):
+        return_dict = super().get_state(day, state)
+        return_dict["player_names"] = self.player_names
+        return_dict["player_timeout_day"] = self.get_day(day)["player_timeout_day"]
+        return return_dict
+
+    def set_app(self, voronoi_app):
+        self.voronoi_app = voronoi_app
+
+    def close(self):
+        self._chunks.clear()
+        self._buf.close()
+
+    def __getstate__(self):
+        raise TypeError("Replays cannot be pickled, open the file again")
+
+
+class _ReplayView:
+    def __init__(self, reader, field):
+        """Field of each day of a replay, e.g. map_states[day]"""
+        self.reader = reader
+        self.field = field
+
+    def __len__(self):
+        return self.reader.num_days
+
+    def __getitem__(self, day):
+        return self.reader.get_day(day)[self.field]
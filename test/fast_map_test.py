@@ -0,0 +1,204 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+
+project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_folder)
+
+import constants
+from game_state import UnitState
+from game_engine import FastMapState
+
+
+# -----------------------------------------------------------------------------
+# 	Helpers
+# -----------------------------------------------------------------------------
+
+def mirrored_formation(rng, n):
+    """Same formation mirrored into each corner. Produces many equidistant cells."""
+    pts = rng.uniform(0, 50, size=(n, 2))
+    return [
+        [(x, y) for x, y in pts],
+        [(x, 100 - y - 1e-6) for x, y in pts],
+        [(100 - x - 1e-6, 100 - y - 1e-6) for x, y in pts],
+        [(100 - x - 1e-6, y) for x, y in pts],
+    ]
+
+
+def random_formation(rng, n):
+    return [[tuple(p) for p in rng.uniform(0, 100, size=(n, 2))] for _ in range(4)]
+
+
+def lattice_formation(rng, n):
+    """Units on a coarse lattice, with shared cells between players"""
+    return [[tuple(p) for p in rng.integers(0, 20, size=(min(n, 50), 2)) * 5 + 0.5] for _ in range(4)]
+
+
+def home_formation(rng, n):
+    """Units clustered at home bases, some players without any units"""
+    player_pts = [[constants.base[player]] * n for player in range(4)]
+    player_pts[rng.integers(0, 4)] = []
+    return player_pts
+
+
+def flood_fill_connectivity(occ_map):
+    """Connectivity map with one cv2.floodFill per player from its home base"""
+    connected = np.full_like(occ_map, 4)
+    for player in range(4):
+        start = tuple(int(v) for v in constants.base[player])
+        if occ_map[start[1], start[0]] != player:
+            continue
+        mask = np.zeros((occ_map.shape[0] + 2, occ_map.shape[1] + 2), np.uint8)
+        flags = 8 | cv2.FLOODFILL_MASK_ONLY | (1 << 8)
+        cv2.floodFill(occ_map, mask, start, player, 0, 0, flags)
+        connected[mask[1:-1, 1:-1].astype(bool)] = player
+    return connected
+
+
+def compute_both(units, mask_grid_pos=None, prev_occ_map=None):
+    maps = []
+    for backend in FastMapState.occupancy_backends:
+        fast_map = FastMapState(constants.max_map_dim, constants.base, occupancy_backend=backend)
+        if prev_occ_map is not None:
+            fast_map.occupancy_map = prev_occ_map.copy()
+        score, map_state = fast_map.update_map_state(units) if mask_grid_pos is None else \
+            (None, fast_map.compute_occupancy_map(units, mask_grid_pos))
+        maps.append((score, map_state, fast_map.occupancy_map))
+    return maps
+
+
+# -----------------------------------------------------------------------------
+# 	Unit Tests
+# -----------------------------------------------------------------------------
+
+def test_occupancy_backend_parity():
+    rng = np.random.default_rng(4444)
+    formations = [mirrored_formation, random_formation, lattice_formation, home_formation]
+    for formation in formations:
+        for n in [1, 2, 5, 20, 100, 400]:
+            units = UnitState.from_points(formation(rng, n))
+            (grid_score, grid_state, grid_occ), (kd_score, kd_state, kd_occ) = compute_both(units)
+
+            assert grid_occ.dtype == kd_occ.dtype
+            assert np.array_equal(grid_occ, kd_occ), f"occupancy_map mismatch: {formation.__name__}, n={n}"
+            assert np.array_equal(grid_state, kd_state), f"map_state mismatch: {formation.__name__}, n={n}"
+            assert list(grid_score) == list(kd_score), f"score mismatch: {formation.__name__}, n={n}"
+
+
+def test_occupancy_backend_parity_masked():
+    rng = np.random.default_rng(4)
+    prev_occ_map = rng.integers(0, 5, size=(constants.max_map_dim, constants.max_map_dim)).astype(np.uint8)
+    mask_grid_pos = rng.random((constants.max_map_dim, constants.max_map_dim)) < 0.3
+    units = UnitState.from_points(mirrored_formation(rng, 30))
+
+    (_, _, grid_occ), (_, _, kd_occ) = compute_both(units, mask_grid_pos=mask_grid_pos,
+                                                    prev_occ_map=prev_occ_map)
+    assert np.array_equal(grid_occ, kd_occ)
+    assert np.array_equal(grid_occ[~mask_grid_pos], prev_occ_map[~mask_grid_pos])
+
+
+def test_occupancy_dispute():
+    # Two units 20 cells apart on the same row: the column halfway between them is disputed
+    units = UnitState.from_points([[(10.5, 50.5)], [(30.5, 50.5)], [], []])
+    for backend in FastMapState.occupancy_backends:
+        fast_map = FastMapState(constants.max_map_dim, constants.base, occupancy_backend=backend)
+        score, map_state = fast_map.update_map_state(units)
+
+        assert list(score) == [2000, 7900, 0, 0]
+        assert all(map_state[20][y] == -1 for y in range(100))
+        assert map_state[19][0] == 1 and map_state[21][99] == 2
+
+
+def test_occupancy_incremental_parity():
+    # Units mostly hovering, some moving, spawning at home or getting killed
+    rng = np.random.default_rng(22)
+    player_pts = [rng.uniform(0, 100, size=(40, 2)) for _ in range(4)]
+    incremental_map = FastMapState(constants.max_map_dim, constants.base, incremental=True)
+    full_map = FastMapState(constants.max_map_dim, constants.base)
+    for step in range(60):
+        for player in range(4):
+            pts = player_pts[player]
+            moving = rng.random(pts.shape[0]) < 0.1
+            pts[moving] += rng.uniform(-1, 1, size=(np.count_nonzero(moving), 2))
+            pts = np.clip(pts, 0, 99.99)
+            if step % 5 == 0:
+                pts = np.vstack([pts, constants.base[player]])
+            if step % 7 == 3:
+                pts = pts[rng.random(pts.shape[0]) > 0.2]
+            player_pts[player] = pts
+
+        units = UnitState.from_points(player_pts)
+        inc_score, inc_state = incremental_map.update_map_state(units)
+        full_score, full_state = full_map.update_map_state(units)
+        assert np.array_equal(incremental_map.occupancy_map, full_map.occupancy_map), f"mismatch at step {step}"
+        assert np.array_equal(inc_state, full_state)
+        assert list(inc_score) == list(full_score)
+
+
+def test_unit_ownership():
+    rng = np.random.default_rng(10)
+    formations = [mirrored_formation, random_formation, lattice_formation, home_formation]
+    for formation in formations:
+        units = UnitState.from_points(formation(rng, 20))
+        fast_map = FastMapState(constants.max_map_dim, constants.base)
+        score, _ = fast_map.update_map_state(units)
+        cell_unit, unit_cells = fast_map.get_unit_ownership(units)
+
+        occ_map = fast_map.occupancy_map
+        assert np.array_equal(cell_unit < 0, occ_map == 4), formation.__name__
+        assert unit_cells.sum() == sum(score)
+        assert np.array_equal(np.bincount(units.player, weights=unit_cells, minlength=4), score)
+
+        # Owning unit is of the occupying player, at the nearest distance of the player's units
+        unit_occ_map = fast_map.get_unit_occupied_cells(units)
+        player_dist = fast_map.get_player_dist_map(unit_occ_map)
+        rows, cols = np.nonzero(cell_unit >= 0)
+        owner = cell_unit[rows, cols]
+        unit_rows, unit_cols = fast_map.get_unit_cells(units)
+        assert np.array_equal(units.player[owner], occ_map[rows, cols])
+        assert np.all(unit_occ_map[unit_rows[owner], unit_cols[owner]] == units.player[owner])
+        owner_dist = (unit_rows[owner] - rows) ** 2 + (unit_cols[owner] - cols) ** 2
+        assert np.array_equal(owner_dist, player_dist[units.player[owner], rows, cols]), formation.__name__
+
+
+def test_connectivity_matches_flood_fill():
+    # Units scattered over the map, some cut off from home. Only some players move at each step, so the
+    # connectivity of the others is reused.
+    rng = np.random.default_rng(7)
+    player_pts = [np.vstack([constants.base[player], rng.uniform(0, 100, size=(30, 2))]) for player in range(4)]
+    fast_map = FastMapState(constants.max_map_dim, constants.base)
+    for step in range(60):
+        for player in rng.choice(4, size=rng.integers(1, 3), replace=False):
+            pts = player_pts[player]
+            moving = rng.random(pts.shape[0]) < 0.3
+            pts[moving] += rng.uniform(-3, 3, size=(np.count_nonzero(moving), 2))
+            player_pts[player] = np.clip(pts, 0, 99.99)
+
+        units = UnitState.from_points(player_pts)
+        fast_map.update_map_state(units)
+        expected = flood_fill_connectivity(fast_map.occupancy_map)
+        assert np.array_equal(fast_map.get_connectivity_map(), expected), f"mismatch at step {step}"
+
+        rows, cols = fast_map.get_unit_cells(units)
+        alive = fast_map.remove_killed_units(units)
+        assert alive.num_units == np.count_nonzero(expected[rows, cols] == units.player)
+
+        # Cells of a single player becoming disputed: only that player is labelled again
+        occ_map = fast_map.occupancy_map.copy()
+        player = step % 4
+        occ_map[(occ_map == player) & (rng.random(occ_map.shape) < 0.2)] = 4
+        fast_map.occupancy_map = occ_map
+        assert np.array_equal(fast_map.get_connectivity_map(), flood_fill_connectivity(occ_map))
+
+
+def test_label_components():
+    masks = np.zeros((2, 5, 5), dtype=bool)
+    masks[0, 0, 0] = masks[0, 1, 1] = masks[0, 4, 4] = True  # Diagonal neighbors are connected
+    masks[1, 0, 0] = True  # Same cell in the next map is a different component
+
+    labels = FastMapState.label_components(masks)
+    assert labels[0, 0, 0] == labels[0, 1, 1] > 0
+    assert len({labels[0, 0, 0], labels[0, 4, 4], labels[1, 0, 0]}) == 3
+    assert np.array_equal(labels > 0, masks)
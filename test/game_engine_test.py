@@ -0,0 +1,201 @@
+import io
+import logging
+import os
+import sys
+
+import numpy as np
+
+project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_folder)
+
+from game_engine import GameEngine, move_units
+from player_sandbox_test import SpreadPlayer
+
+
+# -----------------------------------------------------------------------------
+# 	Unit Tests
+# -----------------------------------------------------------------------------
+
+def test_engine_step_and_run():
+    engine = GameEngine(spawn_day=5, last_day=12, use_timeout=False)
+    engine.reset(2, ("d", "d", "d", "d"))
+
+    assert engine.step() == 0
+    assert engine.get_state(0, 2)["unit_id"] == [["1"]] * 4
+    engine.run()
+    assert engine.done and engine.day == 12
+    assert engine.get_state(11, 0)["unit_id"][3] == ["1", "2", "3"]
+
+    try:
+        engine.step()
+        assert False, "step() after the last day must fail"
+    except RuntimeError:
+        pass
+
+
+def test_engine_reuse_is_reproducible():
+    engine = GameEngine(spawn_day=3, last_day=20, use_timeout=False)
+    results = []
+    for seed in [1, 7, 1]:
+        engine.reset(seed, ("d", "d", "d", "d"))
+        engine.run()
+        results.append(engine.player_total_score[-1][:])
+
+    assert results[0] == results[2]
+    assert results[0] != results[1]
+
+
+def test_engine_cell_ownership():
+    received = []
+
+    class OwnershipPlayer:
+        api_version = 2
+        cell_ownership = True
+
+        def __init__(self, player_idx, **kwargs):
+            self.player_idx = player_idx
+
+        def play(self, unit_id, unit_pos, map_states, current_scores, total_scores, cell_unit, unit_cells):
+            received.append((map_states, current_scores, cell_unit, unit_cells))
+            return [(1.0, np.pi / 4 + self.player_idx * np.pi / 2)] * len(unit_id[self.player_idx])
+
+    engine = GameEngine(spawn_day=2, last_day=10, use_timeout=False)
+    engine.reset(1, ("d", "d"))
+    for player in range(2, 4):
+        engine.add_player(OwnershipPlayer, "o{}".format(player), "o", player)
+    engine.run()
+
+    assert len(received) == 2 * 10
+    for map_states, current_scores, cell_unit, unit_cells in received:
+        assert np.array_equal(cell_unit < 0, map_states == -1)
+        assert [int(counts.sum()) for counts in unit_cells] == current_scores
+        for player in range(4):
+            owned = map_states == player + 1
+            assert np.array_equal(np.bincount(cell_unit[owned], minlength=len(unit_cells[player])),
+                                  unit_cells[player])
+
+
+def test_move_units_matches_move_unit():
+    engine = GameEngine(spawn_day=5, last_day=10, use_timeout=False)
+    rng = np.random.default_rng(0)
+
+    # Units at and next to the walls and corners, moving along, into and away from them
+    edges = [0.0, 0.3, 0.5, 50.0, 99.5, 99.99999999]
+    angles = np.arange(-4, 9) * np.pi / 4
+    distances = [-2.0, -0.5, 0.0, 0.7, 1.0, 1.0 + 1e-9, 5.0]
+    x, y, angle, distance = [arr.ravel() for arr in np.meshgrid(edges, edges, angles, distances, indexing="ij")]
+    pos = np.stack((x, y), axis=-1)
+
+    # Random units, mostly near the walls
+    random_pos = rng.uniform(-0.5, 1.5, (5000, 2)) % 1 * rng.choice([1, 100], (5000, 2))
+    random_pos = np.where(rng.random((5000, 2)) < 0.5, random_pos, 99.99999999 - random_pos)
+    pos = np.concatenate((pos, random_pos))
+    angle = np.concatenate((angle, rng.uniform(-2 * np.pi, 2 * np.pi, 5000)))
+    distance = np.concatenate((distance, rng.uniform(-1, 2, 5000)))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = np.array([engine.move_unit(d, a, p) for d, a, p in zip(distance, angle, pos)], dtype=np.float64)
+    new_pos = move_units(pos, distance, angle)
+    assert np.array_equal(new_pos, expected, equal_nan=True)
+
+
+def test_get_moves():
+    engine = GameEngine(spawn_day=5, last_day=10, use_timeout=False)
+
+    moves = engine.get_moves([(0.5, 1), (None, 0.0), (1.0, float("inf")), (np.float32(2), np.pi)])
+    assert moves.dtype == np.float64 and moves.shape == (4, 2)
+    assert np.isfinite(moves).all(axis=1).tolist() == [True, False, False, True]
+    assert engine.get_moves([(0.5, 1, 2)]) is None
+    assert engine.get_moves([(0.5, 1), (0.5,)]) is None
+    assert engine.get_moves([("a", 1)]) is None
+
+
+def test_parallel_play_matches_sequential():
+    results = []
+    for parallel_play in [False, True]:
+        engine = GameEngine(spawn_day=3, last_day=20, use_timeout=False, parallel_play=parallel_play)
+        engine.reset(1, ())
+        for idx in range(4):
+            engine.add_player(SpreadPlayer, "s{}".format(idx + 1), "s", idx)
+        engine.run()
+        engine.close()
+        results.append((engine.player_total_score[-1], engine.game_state.get_units(19, 2).pos))
+
+    assert results[0][0] == results[1][0]
+    assert np.array_equal(results[0][1], results[1][1])
+
+
+def test_parallel_play_is_reproducible():
+    engine = GameEngine(spawn_day=3, last_day=20, use_timeout=False, parallel_play=True)
+    assert engine.player_timer.clock == "thread"
+    results = []
+    for seed in [1, 1]:
+        engine.reset(seed, ("d", "d", "d", "d"))
+        engine.run()
+        results.append(engine.player_total_score[-1][:])
+    engine.close()
+
+    assert results[0] == results[1]
+
+
+def test_player_rng_per_seat():
+    engine = GameEngine(spawn_day=3, last_day=20, use_timeout=False)
+    engine.reset(3, ())
+    draws = [engine.get_player_rng(idx).random(4) for idx in range(4)]
+    assert np.array_equal(draws[2], engine.get_player_rng(2).random(4))
+    assert not np.array_equal(draws[0], draws[1])
+    np.testing.assert_array_equal(
+        [np.random.default_rng(child).random(4) for child in np.random.SeedSequence(3).spawn(4)], draws)
+
+    results = []
+    for parallel_play in [False, True]:
+        engine = GameEngine(spawn_day=3, last_day=20, use_timeout=False, parallel_play=parallel_play)
+        engine.reset(3, ("d", "d", "d", "d"))
+        engine.run()
+        engine.close()
+        results.append(engine.player_total_score[-1])
+    assert results[0] == results[1]
+
+
+def test_log_moves():
+    # One line per unit in unit order, as logged one unit at a time
+    class MixedPlayer:
+        api_version = 2
+
+        def __init__(self, player_idx, **kwargs):
+            self.player_idx = player_idx
+
+        def play(self, unit_id, unit_pos, map_states, current_scores, total_scores):
+            return [(2.0, 0.5), (float("nan"), 0.0), (0.5, 0.25)][:len(unit_id[self.player_idx])]
+
+    class StillPlayer(MixedPlayer):
+        def play(self, unit_id, unit_pos, map_states, current_scores, total_scores):
+            return [(0.0, 0.0)] * len(unit_id[self.player_idx])
+
+    stream = io.StringIO()
+    logger = logging.getLogger("log_moves_test")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    logger.handlers = [logging.StreamHandler(stream)]
+    engine = GameEngine(spawn_day=1, last_day=3, logger=logger, use_timeout=False)
+    engine.reset(1, ())
+    engine.add_player(MixedPlayer, "m1", "m", 0)
+    for idx in range(1, 4):
+        engine.add_player(StillPlayer, "s{}".format(idx + 1), "s", idx)
+    stream.truncate(0)
+    stream.seek(0)
+    engine.run()
+    logger.handlers = []
+
+    lines = [line for line in stream.getvalue().splitlines()
+             if line.endswith("from m1") or line.startswith(("Distance", "m1"))]
+    unit_ids = engine.game_state.get_units(2, 0).player_ids(0).tolist()
+    expected = ["Received Distance: 2.000, Angle: 0.500 from m1", "Distance rectified to max distance of 1 km"]
+    expected += expected
+    expected += ["m1 {} failed since provided invalid move (nan, 0.0) (must contain tuples of finite value)".format(
+        unit_ids[1])]
+    expected += ["Received Distance: 2.000, Angle: 0.500 from m1", "Distance rectified to max distance of 1 km",
+                 "m1 {} failed since provided invalid move (nan, 0.0) (must contain tuples of finite value)".format(
+                     unit_ids[1]),
+                 "Received Distance: 0.500, Angle: 0.250 from m1"]
+    assert lines == expected
@@ -0,0 +1,78 @@
+import logging
+import os
+import sys
+import threading
+
+import numpy as np
+
+project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_folder)
+
+from game_engine import GameEngine
+from game_logging import LogPipeline, MoveRecorder
+
+
+class ThreadMessage:
+    """Message recording the thread formatting it"""
+    def __init__(self):
+        self.formatted_in = None
+
+    def __str__(self):
+        self.formatted_in = threading.current_thread()
+        return "lazy"
+
+
+# -----------------------------------------------------------------------------
+# 	Unit Tests
+# -----------------------------------------------------------------------------
+
+def test_log_pipeline(tmp_path):
+    pipeline = LogPipeline()
+    logger = logging.getLogger("log_pipeline_test")
+    logger.setLevel(logging.DEBUG)
+    logger.handlers = [pipeline.queue_handler]
+    logger.propagate = False  # Handlers of the root logger, e.g. pytest's, would format the message in this thread
+    handlers = []
+    for name, level in [("debug.log", logging.DEBUG), ("results.log", logging.INFO)]:
+        handler = logging.FileHandler(str(tmp_path / name), mode="w")
+        handler.setLevel(level)
+        handlers.append(handler)
+        pipeline.add_handler(handler)
+    pipeline.start()
+
+    message = ThreadMessage()
+    logger.debug(message)
+    logger.info("Day %d", 1)
+    pipeline.stop()
+    logger.handlers = []
+
+    assert message.formatted_in is not threading.current_thread()
+    assert (tmp_path / "debug.log").read_text() == "lazy\nDay 1\n"
+    assert (tmp_path / "results.log").read_text() == "Day 1\n"
+    assert all(handler.stream is None for handler in handlers)
+
+
+def test_move_recorder(tmp_path):
+    path = str(tmp_path / "moves.npz")
+    engine = GameEngine(spawn_day=3, last_day=10, use_timeout=False, move_recorder=MoveRecorder(path))
+    engine.reset(1, ("d", "d", "d", "d"))
+    engine.run()
+    engine.move_recorder.write()
+
+    moves = np.load(path)
+    assert sorted(moves.files) == sorted(MoveRecorder.columns)
+    for day in range(10):
+        units = engine.game_state.get_units(day, 0)
+        is_day = moves["day"] == day + 1
+        assert np.array_equal(moves["player"][is_day], units.player)
+        assert np.array_equal(moves["unit_id"][is_day], units.unit_id)
+    assert np.all(moves["distance"] <= 1.0)
+
+    recorder = MoveRecorder(path)
+    assert all(len(column) == 0 for column in recorder.get_columns().values())
+
+
+def test_move_recorder_long_game(tmp_path):
+    recorder = MoveRecorder(str(tmp_path / "moves.npz"))
+    recorder.record(40000, 2, [7], np.array([[0.5, 1.0]]))
+    assert recorder.get_columns()["day"].tolist() == [40001]
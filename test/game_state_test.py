@@ -0,0 +1,91 @@
+import os
+import pickle
+import sys
+import threading
+
+import numpy as np
+from shapely.geometry import Point
+
+project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_folder)
+
+import constants
+from game_state import GameState, UnitState
+
+
+# -----------------------------------------------------------------------------
+# 	Unit Tests
+# -----------------------------------------------------------------------------
+
+def test_unit_state_spawn_and_kill():
+    units = UnitState.empty().spawn(constants.base, 1)
+    units = units.moved(units.pos + 1).spawn(constants.base, 2)
+
+    assert units.num_units == 8
+    assert [units.count(player) for player in range(4)] == [2, 2, 2, 2]
+    assert units.ids() == [["1", "2"]] * 4
+    assert np.allclose(units.player_pos(1), [np.add(constants.base[1], 1), constants.base[1]])
+
+    alive = units.subset(units.unit_id == 2)
+    assert alive.ids() == [["2"]] * 4
+    assert [(pt.x, pt.y) for pt in alive.points()[3]] == [constants.base[3]]
+    assert not units.pos.flags.writeable
+
+
+def test_unit_state_from_points():
+    unit_pos = [[Point(1, 2), Point(3, 4)], [], [(5, 6)], []]
+    units = UnitState.from_points(unit_pos, [["1", "3"], [], ["2"], []])
+
+    assert [units.count(player) for player in range(4)] == [2, 0, 1, 0]
+    assert units.ids() == [["1", "3"], [], ["2"], []]
+    assert [[(pt.x, pt.y) for pt in pts] for pts in units.points()] == [[(1, 2), (3, 4)], [], [(5, 6)], []]
+
+
+def test_game_state_views():
+    game_state = GameState(last_day=3)
+    units = UnitState.empty().spawn(constants.base, 1)
+    for state in range(constants.day_states):
+        game_state.set_units(0, state, units)
+    game_state.map_states[0][2][0][99] = -1
+
+    assert len(game_state.unit_pos) == 1  # Only recorded days
+    assert game_state.unit_pos[0][2][1][0].y == constants.base[1][1]
+    assert game_state.unit_id[0][1] == [["1"]] * 4
+    assert game_state.unit_pos[0][0] is game_state.unit_pos[0][0]  # Cached conversion
+
+    state = game_state.get_state(0, 2)
+    assert state["day"] == 1
+    assert state["map_states"][0][99] == -1 and isinstance(state["map_states"][0][99], int)
+    assert state["unit_id"] == [["1"]] * 4
+
+    loaded = pickle.loads(pickle.dumps(game_state))
+    assert loaded.unit_id[0][2] == [["1"]] * 4
+    assert np.array_equal(loaded.map_states, game_state.map_states)
+
+
+def test_game_state_views_across_threads():
+    # The GUI thread reads states while the simulation thread converts its play() inputs
+    game_state = GameState(last_day=20)
+    units = UnitState.empty().spawn(constants.base, 1)
+    for day in range(20):
+        for state in range(constants.day_states):
+            game_state.set_units(day, state, units.moved(units.pos + day * 0.1))
+    errors = []
+
+    def read(days):
+        try:
+            for _ in range(50):
+                for day in days:
+                    pts = game_state.unit_pos[day][1]
+                    assert abs(pts[0][0].x - (constants.base[0][0] + day * 0.1)) < 1e-9
+                    assert game_state.unit_id[day][1] == [["1"]] * 4
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read, args=(range(i, 20, 3),)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(game_state._cache) <= game_state._cache_size
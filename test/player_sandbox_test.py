@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_folder)
+
+import constants
+from game_engine import GameEngine
+from player_sandbox import PlayerSandbox
+
+
+# Players are created in worker processes, so they must be importable from this module
+class SpreadPlayer:
+    """Deterministic player moving its units away from home, each along its own heading"""
+    api_version = 2
+
+    def __init__(self, player_idx, **kwargs):
+        self.player_idx = player_idx
+
+    def play(self, unit_id, unit_pos, map_states, current_scores, total_scores):
+        ids = unit_id[self.player_idx]
+        return [(1.0, self.player_idx * np.pi / 2 + np.pi / 4 + 0.2 * np.sin(i)) for i in ids]
+
+
+class HungPlayer(SpreadPlayer):
+    def play(self, unit_id, unit_pos, map_states, current_scores, total_scores):
+        if len(unit_id[self.player_idx]) > 1:
+            time.sleep(3600)
+        return super().play(unit_id, unit_pos, map_states, current_scores, total_scores)
+
+
+def play(engine, player_classes):
+    engine.reset(1, ())
+    for idx, player_class in enumerate(player_classes):
+        engine.add_player(player_class, "p{}".format(idx + 1), "p", idx)
+    engine.run()
+    return engine.player_total_score[-1]
+
+
+# -----------------------------------------------------------------------------
+# 	Unit Tests
+# -----------------------------------------------------------------------------
+
+def test_sandbox_matches_in_process():
+    player_classes = [SpreadPlayer] * 4
+    expected = play(GameEngine(spawn_day=3, last_day=20, use_timeout=False), player_classes)
+
+    engine = GameEngine(spawn_day=3, last_day=20, use_timeout=False, sandbox=True)
+    try:
+        assert play(engine, player_classes) == expected
+        # Workers are kept for the next game
+        assert play(engine, player_classes) == expected
+        assert all(stats["calls"] == 20 for stats in engine.player_timer.get_latency_stats())
+    finally:
+        engine.close()
+
+
+def test_sandbox_stops_hung_player():
+    engine = GameEngine(spawn_day=3, last_day=12, sandbox=True)
+    try:
+        engine.reset(1, ())
+        engine.player_time = [0.5] * constants.no_of_players
+        for idx, player_class in enumerate([SpreadPlayer, HungPlayer, SpreadPlayer, SpreadPlayer]):
+            engine.add_player(player_class, "p{}".format(idx + 1), "p", idx)
+        start_time = time.time()
+        engine.run()
+        run_time = time.time() - start_time
+    finally:
+        engine.close()
+
+    assert run_time < 5
+    assert engine.player_timeout == [False, True, False, False]
+    assert engine.player_timeout_day[1] == 4  # Second unit spawns at the end of day 3
+    assert not engine.sandbox.is_alive(1)
+
+
+def test_sandbox_reports_init_errors():
+    class LocalPlayer(SpreadPlayer):
+        pass  # Cannot be pickled by reference
+
+    sandbox = PlayerSandbox(max_units=8)
+    try:
+        sandbox.init_player(0, LocalPlayer, dict(player_idx=0), GameEngine(1, 2).logger)
+        assert False, "Unpicklable player must fail"
+    except Exception:
+        pass
+    finally:
+        sandbox.close()
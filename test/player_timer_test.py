@@ -0,0 +1,61 @@
+import gc
+import os
+import sys
+import time
+
+project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_folder)
+
+from game_engine import GameEngine
+from player_timer import PlayerTimer
+
+
+# -----------------------------------------------------------------------------
+# 	Unit Tests
+# -----------------------------------------------------------------------------
+
+def test_cpu_clock_ignores_waiting():
+    cpu_timer, wall_timer = PlayerTimer(2, "cpu"), PlayerTimer(2, "wall")
+    for timer in (cpu_timer, wall_timer):
+        with timer.time_call(1):
+            time.sleep(0.05)
+
+    assert wall_timer.last_call_time(1) >= 0.05
+    assert cpu_timer.last_call_time(1) < 0.02
+    assert cpu_timer.get_latency_stats()[0] is None
+    assert cpu_timer.get_latency_stats()[1]["calls"] == 1
+
+
+def test_gc_disabled_during_call():
+    timer = PlayerTimer(1, disable_gc=True)
+    assert gc.isenabled()
+    with timer.time_call(0):
+        assert not gc.isenabled()
+    assert gc.isenabled()
+
+    try:
+        with timer.time_call(0):
+            raise ValueError()
+    except ValueError:
+        pass
+    assert gc.isenabled() and len(timer.call_times[0]) == 2
+
+    # Concurrent calls: enabled again when the last one ends
+    with timer.time_call(0):
+        with timer.time_call(0):
+            pass
+        assert not gc.isenabled()
+    assert gc.isenabled()
+
+
+def test_engine_latency_stats():
+    engine = GameEngine(spawn_day=5, last_day=12, use_timeout=False, player_clock="wall")
+    engine.reset(2, ("d", "d", "d", "d"))
+    engine.run()
+
+    stats = engine.player_timer.get_latency_stats()
+    assert [player_stats["calls"] for player_stats in stats] == [12] * 4
+    for i, player_stats in enumerate(stats):
+        assert player_stats["p50"] <= player_stats["p95"] <= player_stats["max"]
+        assert abs(engine.last_day - engine.player_time[i] - player_stats["total"]) < 1e-6
+    assert "Default Player.1" in engine.player_timer.summary(engine.player_names)
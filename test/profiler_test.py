@@ -0,0 +1,43 @@
+import csv
+import json
+import os
+import sys
+
+project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_folder)
+
+from game_engine import GameEngine
+from profiler import DayProfiler
+
+
+# -----------------------------------------------------------------------------
+# 	Unit Tests
+# -----------------------------------------------------------------------------
+
+def test_engine_profile(tmp_path):
+    profiler = DayProfiler(GameEngine.profile_phases)
+    engine = GameEngine(spawn_day=5, last_day=12, use_timeout=False, profiler=profiler)
+    engine.reset(2, ("d", "d", "d", "d"))
+    engine.run()
+
+    assert [row["day"] for row in profiler.rows] == list(range(1, 13))
+    assert "occupancy_0_wall" in profiler.rows[5] and "state_copy_wall" in profiler.rows[6]
+    assert profiler.rows[11]["units_1"] == 3 and profiler.rows[11]["killed_1"] == 0
+    phases = profiler.get_phases()
+    assert phases == [phase for phase in GameEngine.profile_phases if phase in phases]
+    assert {"play_1", "moves", "occupancy_1", "connectivity", "kills"} <= set(phases)
+    assert all(wall >= 0 and days > 0 for wall, cpu, days in profiler.get_phase_totals().values())
+    assert "play Player 1" in profiler.summary({"play_1": "play Player 1"})
+
+    csv_path, jsonl_path = str(tmp_path / "profile.csv"), str(tmp_path / "profile.jsonl")
+    profiler.write(csv_path)
+    profiler.write(jsonl_path)
+    with open(csv_path) as f:
+        csv_rows = list(csv.DictReader(f))
+    with open(jsonl_path) as f:
+        json_rows = [json.loads(line) for line in f]
+    assert len(csv_rows) == len(json_rows) == 12
+    assert csv_rows[0]["state_copy_wall"] == "" and json_rows[1] == profiler.rows[1]
+
+    engine.reset(2, ("d", "d", "d", "d"))
+    assert profiler.rows == []
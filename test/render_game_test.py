@@ -0,0 +1,56 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+
+project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_folder)
+
+from game_engine import GameEngine
+from render_game import OccupancyFrameRenderer, get_chunk_shards, render, render_video
+from replay_test import write_replay
+
+
+# -----------------------------------------------------------------------------
+# 	Unit Tests
+# -----------------------------------------------------------------------------
+
+def test_render_frames(tmp_path):
+    replay_path, out_dir = str(tmp_path / "game.replay"), str(tmp_path / "render")
+    engine = GameEngine(spawn_day=2, last_day=6, use_timeout=False)
+    engine.reset(4, ("d", "d", "d", "d"))
+    write_replay(engine, replay_path, chunk_days=4).close()
+
+    assert get_chunk_shards(replay_path) == [[-1, 0, 1, 2, 3], [4, 5]]
+    render(replay_path, out_dir, workers=2)
+    assert sorted(os.listdir(out_dir)) == ["{}.png".format(day) for day in range(7)]
+
+
+def test_render_video(tmp_path):
+    replay_path, video_path = str(tmp_path / "game.replay"), str(tmp_path / "game.mp4")
+    engine = GameEngine(spawn_day=2, last_day=10, use_timeout=False)
+    engine.reset(4, ("d", "d", "d", "d"))
+    write_replay(engine, replay_path, chunk_days=4).close()
+
+    render_video(replay_path, video_path, workers=2, scale_px=4)
+    video = cv2.VideoCapture(video_path)
+    assert int(video.get(cv2.CAP_PROP_FRAME_COUNT)) == 11
+    assert (video.get(cv2.CAP_PROP_FRAME_WIDTH), video.get(cv2.CAP_PROP_FRAME_HEIGHT)) == (400, 400)
+    video.release()
+
+
+def test_occupancy_frame(tmp_path):
+    replay_path = str(tmp_path / "game.replay")
+    engine = GameEngine(spawn_day=2, last_day=4, use_timeout=False)
+    engine.reset(4, ("d", "d", "d", "d"))
+    write_replay(engine, replay_path, chunk_days=4).close()
+
+    frames = OccupancyFrameRenderer(replay_path, scale_px=4)
+    frame = frames.draw(3)
+    assert frame.shape == (400, 400, 3) and frame.dtype == np.uint8
+    # Cell (x, y) = (30, 80) is left of the map, away from grid lines and units: colored as its player
+    player = engine.map_states[3][2][30][80]
+    assert tuple(frame[80 * 4 + 2, 30 * 4 + 2]) == frames.renderer._hex_to_rgb(
+        frames.renderer.player_back_colors[player - 1])
+    frames.replay.close()
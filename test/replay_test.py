@@ -0,0 +1,101 @@
+import os
+import sys
+
+import numpy as np
+
+project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_folder)
+
+import constants
+from game_engine import GameEngine
+from game_state import UnitState
+from replay import ReplayReader, ReplayWriter, iter_replay
+
+
+def write_replay(engine, path, chunk_days):
+    writer = ReplayWriter(path, engine.player_names, engine.last_day, engine.spawn_day, chunk_days=chunk_days)
+    for day in range(engine.last_day):
+        engine.step()
+        writer.write_day(day, engine.map_states[day],
+                         [engine.game_state.get_units(day, state) for state in range(constants.day_states)],
+                         engine.player_score[day], engine.player_total_score[day], engine.player_timeout_day)
+    return writer
+
+
+# -----------------------------------------------------------------------------
+# 	Unit Tests
+# -----------------------------------------------------------------------------
+
+def test_replay_round_trip(tmp_path):
+    path = str(tmp_path / "game.replay")
+    engine = GameEngine(spawn_day=2, last_day=30, use_timeout=False)
+    engine.reset(4, ("d", "d", "d", "d"))
+    writer = write_replay(engine, path, chunk_days=7)
+    writer.close()
+    assert len(writer.index) == 5
+
+    metadata, days = iter_replay(path)
+    assert metadata["player_names"] == engine.player_names and metadata["last_day"] == 30
+    days = list(days)
+    assert [game_day["day"] for game_day in days] == list(range(30))
+    for day, game_day in enumerate(days):
+        assert np.array_equal(game_day["map_states"], engine.map_states[day])
+        assert game_day["player_score"] == engine.player_score[day]
+        assert game_day["player_total_score"] == engine.player_total_score[day]
+        for state in range(constants.day_states):
+            units, expected = game_day["units"][state], engine.game_state.get_units(day, state)
+            assert np.array_equal(units.player, expected.player)
+            assert np.array_equal(units.unit_id, expected.unit_id)
+            assert np.array_equal(units.pos, expected.pos)
+
+
+def test_replay_without_index(tmp_path):
+    # A game still being written: complete chunks are readable without the index
+    path = str(tmp_path / "game.replay")
+    engine = GameEngine(spawn_day=2, last_day=10, use_timeout=False)
+    engine.reset(4, ("d", "d", "d", "d"))
+    writer = write_replay(engine, path, chunk_days=4)
+
+    metadata, days = iter_replay(path)
+    assert [game_day["day"] for game_day in days] == list(range(8))
+    writer.close()
+
+
+def test_replay_reader(tmp_path):
+    path = str(tmp_path / "game.replay")
+    engine = GameEngine(spawn_day=2, last_day=30, use_timeout=False)
+    engine.reset(4, ("d", "d", "d", "d"))
+    write_replay(engine, path, chunk_days=4).close()
+
+    replay = ReplayReader(path, cache_chunks=2)
+    assert replay.num_days == len(replay.map_states) == 30
+    assert replay.player_names == engine.player_names
+    for day in [29, 0, 13, 14, 2, 29]:
+        for state in range(constants.day_states):
+            assert np.array_equal(replay.map_states[day][state], engine.map_states[day][state])
+            expected = engine.get_state(day, state)
+            result = replay.get_state(day, state)
+            assert sorted(result) == sorted(expected)
+            for key in ["day", "day_states", "map_states", "player_score", "player_total_score", "unit_id",
+                        "player_names", "player_timeout_day"]:
+                assert result[key] == expected[key]
+            for pts, expected_pts in zip(result["unit_pos"], expected["unit_pos"]):
+                assert [(pt.x, pt.y) for pt in pts] == [(pt.x, pt.y) for pt in expected_pts]
+        assert len(replay._chunks) <= 2
+    replay.close()
+
+
+def test_replay_keeps_positions_on_map(tmp_path):
+    # Units clamped to the edge of the map stay on it
+    path = str(tmp_path / "game.replay")
+    units = UnitState(np.array([[99.99999999, 0.5], [3.25, 99.99999999]]), np.array([0, 1], dtype=np.int8),
+                      np.array([1, 1], dtype=np.int32))
+    map_states = np.ones((constants.day_states, constants.max_map_dim, constants.max_map_dim), dtype=np.int8)
+    writer = ReplayWriter(path, ["a", "b", "c", "d"], 1, 1)
+    writer.write_day(0, map_states, [units] * constants.day_states, [[0] * 4] * 3, [0] * 4, [0] * 4)
+    writer.close()
+
+    replay = ReplayReader(path)
+    assert np.array_equal(replay.get_units(0, 2).pos, units.pos)
+    assert np.all(replay.get_units(0, 2).pos < constants.max_map_dim)
+    replay.close()
@@ -0,0 +1,128 @@
+import base64
+import logging
+import os
+import sys
+
+import cv2
+import numpy as np
+
+project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_folder)
+
+import constants
+from game_engine import GameEngine
+from replay import ReplayReader
+from replay_test import write_replay
+from voronoi_app import VoronoiApp
+
+
+def open_app(tmp_path, last_day, raster_board=False, num_days=None):
+    # The widgets of the app can be built and updated without starting the server
+    path = str(tmp_path / "game.replay")
+    engine = GameEngine(spawn_day=2, last_day=last_day, use_timeout=False)
+    engine.reset(4, ("d", "d", "d", "d"))
+    write_replay(engine, path, chunk_days=4).close()
+    replay = ReplayReader(path)
+    if num_days is not None:
+        replay.num_days = num_days  # As if the game was still being played
+    app = object.__new__(VoronoiApp)
+    app.main(replay, logging.getLogger(__name__), raster_board)
+    return app, replay
+
+
+def tile_owners(app):
+    """Map state shown by the tiles, rebuilt from the rectangles of each column"""
+    scale = min(app.scale.x * app.vis_width, app.scale.y * app.vis_height)
+    colors = {color: player + 1 for player, color in enumerate(constants.tile_color)}
+    colors[constants.dispute_color] = -1
+    owners = np.zeros((constants.max_map_dim, constants.max_map_dim), dtype=np.int8)
+    for x, column in enumerate(app.tile_columns):
+        y = 0
+        for rect in column.children.values():
+            cells = int(round(float(rect.attributes["height"]) / scale))
+            owners[x, y:y + cells] = colors[rect.attributes["fill"]]
+            y += cells
+        assert y == constants.max_map_dim
+    return owners
+
+
+# -----------------------------------------------------------------------------
+# 	Unit Tests
+# -----------------------------------------------------------------------------
+
+def test_tiles_follow_map(tmp_path):
+    app, replay = open_app(tmp_path, last_day=8)
+    assert np.array_equal(tile_owners(app), replay.map_states[0][0])
+    for day, state in [(0, 1), (3, 2), (7, 1), (1, 0)]:
+        app.display_map(day, state)
+        assert np.array_equal(tile_owners(app), replay.map_states[day][state])
+    replay.close()
+
+
+def test_layers_order(tmp_path):
+    app, replay = open_app(tmp_path, last_day=4)
+    layers = list(app.svgplot.children.values())
+    assert layers[0] is app.tile_layer and layers[-1] is app.unit_layer
+    # Bases, then the map border on top of the tiles, which must not hide them
+    border = layers[-2]
+    assert "stroke" in border.attributes
+    assert border.attributes["fill"] == "none"
+    replay.close()
+
+
+def test_tiles_redraw_changed_columns(tmp_path):
+    app, replay = open_app(tmp_path, last_day=8)
+    app.display_map(5, 0)
+    before = [list(column.children.values()) for column in app.tile_columns]
+    app.display_map(5, 1)
+
+    changed = np.any(replay.map_states[5][0] != replay.map_states[5][1], axis=1)
+    assert 0 < np.count_nonzero(changed) < constants.max_map_dim
+    for x, column in enumerate(app.tile_columns):
+        assert (list(column.children.values()) == before[x]) != changed[x]
+    replay.close()
+
+
+def test_raster_board(tmp_path):
+    app, replay = open_app(tmp_path, last_day=8, raster_board=True)
+    board = app.board
+    board.cache_frames = 3
+    app.display_map(4, 2)
+    src = board.attributes["src"]
+    png = base64.b64decode(src[len("data:image/png;base64,"):])
+    img = cv2.imdecode(np.frombuffer(png, dtype=np.uint8), cv2.IMREAD_COLOR)[:, :, ::-1]
+    expected = board.renderer.get_colored_occ_map(board.renderer.get_occ_map(replay.map_states[4][2]),
+                                                  replay.unit_pos[4][2])
+    assert np.array_equal(img, expected)
+
+    # Frames already seen come from the cache, least recently used first out
+    for day, state in [(5, 0), (4, 2), (6, 1)]:
+        app.display_map(day, state)
+    assert list(board._frames) == [(5, 0), (4, 2), (6, 1)]
+    app.display_map(4, 2)
+    assert board.attributes["src"] == src
+    replay.close()
+
+
+def test_follow_live(tmp_path):
+    # A game still being played: only the days played so far can be shown, new days are listed as they complete
+    app, replay = open_app(tmp_path, last_day=8, num_days=3)
+    assert (app.curr_day, app.curr_state) == (2, 2) and app.follow_live.get_value()
+    assert len(app.view_drop_down.children) == 3
+
+    replay.num_days = 5
+    app.idle()
+    assert len(app.view_drop_down.children) == 5
+    assert (app.curr_day, app.curr_state) == (4, 2)
+    assert np.array_equal(tile_owners(app), replay.map_states[4][2])
+
+    app.display_map(3, 0)
+    assert (app.curr_day, app.curr_state) == (3, 0) and not app.follow_live.get_value()
+    replay.num_days = 8
+    app.idle()
+    assert len(app.view_drop_down.children) == 8
+    assert (app.curr_day, app.curr_state) == (3, 0)
+
+    app.follow_live_changed(app.follow_live, True)
+    assert (app.curr_day, app.curr_state) == (7, 2)
+    replay.close()
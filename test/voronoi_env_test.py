@@ -0,0 +1,69 @@
+import os
+import sys
+
+import numpy as np
+
+project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_folder)
+
+from game_engine import GameEngine
+from voronoi_env import VoronoiVecEnv
+
+
+class ScriptedPlayer:
+    """Plays the moves of a shared actions array, so a GameEngine game can be compared with the env"""
+    api_version = 2
+    actions = None  # Shape: [E, 4, K, 2]. Moves of the current day
+    env = 0  # Game of the env the engine is compared with
+
+    def __init__(self, player_idx, **kwargs):
+        self.player_idx = player_idx
+
+    def play(self, unit_id, unit_pos, map_states, current_scores, total_scores):
+        moves = ScriptedPlayer.actions[ScriptedPlayer.env, self.player_idx]
+        return [(float(moves[i - 1, 0]), float(moves[i - 1, 1])) for i in unit_id[self.player_idx]]
+
+
+# -----------------------------------------------------------------------------
+# 	Unit Tests
+# -----------------------------------------------------------------------------
+
+def test_env_matches_engine():
+    num_envs, spawn_day, last_day = 2, 3, 60
+    env = VoronoiVecEnv(num_envs, spawn_day, last_day)
+    obs = env.reset()
+    assert obs["map_state"].shape == (num_envs, 100, 100)
+    assert obs["unit_alive"].shape == (num_envs, 4, env.max_units)
+
+    engines = []
+    for i in range(num_envs):
+        engine = GameEngine(spawn_day, last_day, use_timeout=False)
+        engine.reset(1, ())
+        for player in range(4):
+            engine.add_player(ScriptedPlayer, "s{}".format(player), "s", player)
+        engines.append(engine)
+
+    # Units of players 1 and 4 head at each other along the bottom edge, so some are cut off and killed
+    rng = np.random.default_rng(0)
+    heading = np.array([0, -np.pi / 2, np.pi, np.pi])[:, None]
+    killed = False
+    for day in range(last_day):
+        actions = np.stack((rng.uniform(0.5, 1.5, env.unit_alive.shape),
+                            heading + rng.uniform(-0.2, 0.2, env.unit_alive.shape)), axis=-1)
+        actions[0, 1, 0] = np.nan  # Invalid move, unit stays
+        ScriptedPlayer.actions = actions
+
+        start_obs = obs
+        obs, rewards, dones, info = env.step(actions)
+        for i, engine in enumerate(engines):
+            ScriptedPlayer.env = i
+            engine.step()
+            units = engine.game_state.get_units(day, 0)
+            assert np.array_equal(start_obs["map_state"][i], engine.map_states[day][0])
+            assert np.array_equal(start_obs["unit_pos"][i][start_obs["unit_alive"][i]], units.pos)
+            assert rewards[i].tolist() == engine.player_score[day][2]
+            killed |= engine.game_state.get_units(day, 2).num_units < units.num_units
+
+    assert killed
+    assert dones.all() and env.done
+    assert info["player_total_score"].tolist() == [engine.player_total_score[-1] for engine in engines]
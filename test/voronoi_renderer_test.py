@@ -0,0 +1,93 @@
+import os
+import sys
+
+import cv2
+import matplotlib as mpl
+import numpy as np
+
+project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_folder)
+
+import constants
+from game_state import UnitState
+from voronoi_renderer import VoronoiRender
+
+
+def colormap_occ_map(renderer, occ_map, units=None, draw_major_lines=True):
+    """get_colored_occ_map() as it was before the palette lookup: matplotlib colormap on every call"""
+    cmap = mpl.colors.ListedColormap([*renderer.player_back_colors, '#ffffff'])
+    norm = mpl.colors.BoundaryNorm([-0.5, 0.5, 1.5, 2.5, 3.5, 4.5], 5)
+    grid_rgb = (cmap(norm(occ_map))[:, :, :3] * 255).astype(np.uint8)
+    grid_rgb = cv2.resize(grid_rgb, None, fx=renderer.scale_px, fy=renderer.scale_px, interpolation=cv2.INTER_NEAREST)
+    if draw_major_lines:
+        h, w, _ = grid_rgb.shape
+        cols = min(10, occ_map.shape[1])
+        thickness = renderer.grid_line_thickness
+        for x in np.linspace(start=int(thickness / 2), stop=w - int(thickness / 2), num=cols + 1):
+            x = int(round(x))
+            cv2.line(grid_rgb, (x, 0), (x, h), color=(0, 0, 0), thickness=thickness)
+            cv2.line(grid_rgb, (0, x), (w, x), color=(0, 0, 0), thickness=thickness)
+    if units is not None:
+        for player in range(4):
+            for pt in units[player]:
+                cv2.circle(grid_rgb, renderer.metric_to_px(pt.coords[:][0]), renderer.unit_size_px,
+                           renderer.player_colors[player], -1)
+    return grid_rgb
+
+
+# -----------------------------------------------------------------------------
+# 	Unit Tests
+# -----------------------------------------------------------------------------
+
+def test_colored_occ_map():
+    renderer = VoronoiRender(10, scale_px=4)
+    occ_map = np.full((10, 10), 4)
+    occ_map[2, 7] = 1
+    img = renderer.get_colored_occ_map(occ_map, draw_major_lines=False)
+    assert img.shape == (40, 40, 3) and img.dtype == np.uint8
+    assert tuple(img[2 * 4 + 1, 7 * 4 + 1]) == renderer._hex_to_rgb(renderer.player_back_colors[1])
+    assert tuple(img[0, 0]) == (255, 255, 255)
+
+
+def test_colored_occ_map_updates():
+    # Redrawing only the changed cells gives the same images as rendering each map from scratch
+    rng = np.random.default_rng(0)
+    renderer = VoronoiRender(20, scale_px=5)
+    occ_map = rng.integers(0, 5, (20, 20))
+    for i in range(10):
+        occ_map = occ_map.copy()
+        occ_map[rng.random((20, 20)) < 0.1] = rng.integers(0, 5)
+        draw_major_lines = i != 5
+        img = renderer.get_colored_occ_map(occ_map, draw_major_lines=draw_major_lines)
+        expected = VoronoiRender(20, scale_px=5).get_colored_occ_map(occ_map, draw_major_lines=draw_major_lines)
+        assert np.array_equal(img, expected)
+
+
+def test_colored_occ_map_unit_arrays():
+    # Unit positions as arrays draw the same units as shapely Points
+    pos = np.array([[10.2, 3.7], [0.0, 99.5], [99.9, 99.9], [55.5, 1.0]])
+    units = UnitState.empty().spawn(constants.base, 1).moved(pos)
+    occ_map = np.full((100, 100), 4)
+    from_points = VoronoiRender(100).get_colored_occ_map(occ_map, units.points())
+    from_arrays = VoronoiRender(100).get_colored_occ_map(occ_map, [units.player_pos(p) for p in range(4)])
+    assert np.array_equal(from_points, from_arrays)
+    assert not np.array_equal(from_arrays, VoronoiRender(100).get_colored_occ_map(occ_map))
+
+
+def test_colored_occ_map_matches_colormap():
+    # Same pixels as the matplotlib colormap rendering, on a fixed map and units
+    occ_map = np.full((100, 100), 4)
+    occ_map[:50, :50], occ_map[50:, :50], occ_map[50:, 50:], occ_map[:50, 50:] = 0, 1, 2, 3
+    occ_map[40:60, 45:55] = 4
+    occ_map[10:20, 70:90] = 2
+    pos = np.array([[10.2, 3.7], [0.0, 99.5], [99.9, 99.9], [55.5, 1.0]])
+    units = UnitState.empty().spawn(constants.base, 1).moved(pos).points()
+
+    renderer = VoronoiRender(100)
+    for draw_major_lines in [True, False]:
+        expected = colormap_occ_map(renderer, occ_map, units, draw_major_lines)
+        assert np.array_equal(renderer.get_colored_occ_map(occ_map, units, draw_major_lines), expected)
+    # Updating from a previous map gives the same pixels too
+    occ_map[0:30, 0:30] = 1
+    assert np.array_equal(renderer.get_colored_occ_map(occ_map, units, False),
+                          colormap_occ_map(renderer, occ_map, units, False))
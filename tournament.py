@@ -0,0 +1,132 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import constants
+
+
+def job_key(job):
+    """Identifies a game of the tournament, used to skip games already in the results file"""
+    return job["seed"], job["spawn"], job["last"], tuple(job["seating"])
+
+
+def build_jobs(seeds, spawns, lasts, seatings):
+    jobs = []
+    for seed, spawn, last, seating in itertools.product(seeds, spawns, lasts, seatings):
+        jobs.append({"seed": seed, "spawn": spawn, "last": last, "seating": list(seating)})
+    return jobs
+
+
+def get_seatings(players, sample=None, sample_seed=None):
+    """All seatings of the given players in the 4 slots, or a random sample of them"""
+    seatings = list(itertools.product(players, repeat=constants.no_of_players))
+    if sample is not None and sample < len(seatings):
+        rng = np.random.default_rng(sample_seed)
+        idx = np.sort(rng.choice(len(seatings), size=sample, replace=False))
+        seatings = [seatings[i] for i in idx]
+    return seatings
+
+
+def load_completed(results_path):
+    """Keys of the games already recorded without error in the results file"""
+    completed = set()
+    if not os.path.isfile(results_path):
+        return completed
+    with open(results_path, "r") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written row of an interrupted run
+            if "error" not in row:
+                completed.add(job_key(row))
+    return completed
+
+
+_engines = dict()  # Game engines of a worker process, reused across games with the same settings
+
+
+def get_engine(spawn, last, use_timeout):
+    from game_engine import GameEngine
+
+    key = (spawn, last, use_timeout)
+    if key not in _engines:
+        _engines[key] = GameEngine(spawn, last, use_timeout=use_timeout)
+    return _engines[key]
+
+
+def play_job(job, disable_timeout=False):
+    """Play one headless game. Runs in a worker process."""
+    row = dict(job)
+    start_time = time.time()
+    start_cpu = time.process_time()
+    try:
+        game = get_engine(job["spawn"], job["last"], not disable_timeout)
+        with contextlib.redirect_stdout(io.StringIO()):
+            game.reset(job["seed"], tuple(job["seating"]))
+            game.run()
+    except Exception as e:
+        row["error"] = repr(e)
+        return row
+
+    row["player_names"] = game.player_names
+    row["day_scores"] = [[int(s) for s in game.player_score[day][2]] for day in range(game.last_day)]
+    row["total_scores"] = [int(s) for s in game.player_total_score[game.last_day - 1]]
+    row["timeout_day"] = game.player_timeout_day
+    row["player_time"] = [round(game.last_day - t, 6) for t in game.player_time]  # Time charged to each player
+    row["player_latency"] = game.player_timer.get_latency_stats()  # Per-call time of each player
+    row["cpu_time"] = round(time.process_time() - start_cpu, 6)
+    row["elapsed"] = round(time.time() - start_time, 6)
+    return row
+
+
+def run_tournament(jobs, results_path, max_workers=None, disable_timeout=False):
+    completed = load_completed(results_path)
+    pending = [job for job in jobs if job_key(job) not in completed]
+    print("{} games, {} already completed, {} to play".format(len(jobs), len(jobs) - len(pending), len(pending)))
+    if not pending:
+        return
+
+    results_dir = os.path.dirname(results_path)
+    if results_dir:
+        os.makedirs(results_dir, exist_ok=True)
+
+    with open(results_path, "a") as f, ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(play_job, job, disable_timeout) for job in pending]
+        for i, future in enumerate(as_completed(futures)):
+            row = future.result()
+            f.write(json.dumps(row) + "\n")
+            f.flush()  # Keep rows of completed games if interrupted
+            print("Game {}/{} complete: seed {} seating {} - {}".format(
+                i + 1, len(pending), row["seed"], row["seating"], row.get("total_scores", row.get("error"))))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play many headless games in parallel and record their results")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1], help="Seeds of the games")
+    parser.add_argument("--spawn", type=int, nargs="+", default=[5], help="Spawn settings of the games")
+    parser.add_argument("--last", type=int, nargs="+", default=[100], help="Number of days settings of the games")
+    parser.add_argument("--players", nargs="+", default=constants.possible_players,
+                        help="Players to seat in the 4 slots, every seating is played")
+    parser.add_argument("--sample", type=int, default=None, help="Only play a random sample of this many seatings")
+    parser.add_argument("--sample_seed", type=int, default=0, help="Seed used to sample seatings")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes, default: CPU count")
+    parser.add_argument("--results", default=os.path.join("tournament", "results.jsonl"),
+                        help="JSON lines file the results are appended to. Games already in it are skipped.")
+    parser.add_argument("--disable_timeout", action="store_true", help="Disable timeouts for player code")
+    args = parser.parse_args()
+
+    for player in args.players:
+        if player not in constants.possible_players:
+            parser.error("Invalid player {}, choose from {}".format(player, constants.possible_players))
+
+    seatings = get_seatings(args.players, args.sample, args.sample_seed)
+    tournament_jobs = build_jobs(args.seeds, args.spawn, args.last, seatings)
+    run_tournament(tournament_jobs, args.results, max_workers=args.workers, disable_timeout=args.disable_timeout)
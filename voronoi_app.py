@@ -1,11 +1,53 @@
+import base64
+import collections
 import os
+import cv2
 import numpy as np
 from shapely.geometry import Point, Polygon
 import constants
+from voronoi_renderer import VoronoiRender
 
 from remi import App, gui
 
 
+class RasterBoard(gui.Image):
+    def __init__(self, voronoi_game, scale_px=8, cache_frames=64, *args, **kwargs):
+        """Board drawn on the server with VoronoiRender and sent as a single PNG image per update, instead of SVG
+        tiles and units.
+
+        Encoded frames are kept in an LRU cache keyed by (day, state), so going back to a day already seen costs
+        nothing.
+
+        Args:
+            voronoi_game: Game or replay shown
+            scale_px: Width of a cell in pixels
+            cache_frames: Number of encoded frames kept
+        """
+        super(RasterBoard, self).__init__('', *args, **kwargs)
+        self.voronoi_game = voronoi_game
+        self.renderer = VoronoiRender(constants.max_map_dim, scale_px=scale_px, unit_px=max(1, scale_px // 2))
+        self.cache_frames = cache_frames
+        self._frames = collections.OrderedDict()  # (day, state) -> PNG data URL
+
+    def get_frame(self, day, state):
+        """PNG data URL of the board at a day and state"""
+        key = (day, state)
+        if key in self._frames:
+            self._frames.move_to_end(key)
+            return self._frames[key]
+
+        occ_map = VoronoiRender.get_occ_map(np.asarray(self.voronoi_game.map_states[day][state]))
+        img = self.renderer.get_colored_occ_map(occ_map, self.voronoi_game.unit_pos[day][state])
+        _, png = cv2.imencode(".png", img[:, :, ::-1])
+        self._frames[key] = "data:image/png;base64," + base64.b64encode(png.tobytes()).decode()
+        if len(self._frames) > self.cache_frames:
+            self._frames.popitem(last=False)
+        return self._frames[key]
+
+    def display(self, day, state):
+        self.set_image(self.get_frame(day, state))
+
+
 class VoronoiApp(App):
     def __init__(self, *args):
         res_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'res')
@@ -49,15 +91,13 @@ class VoronoiApp(App):
         point = self.convert_coord(point)
         return gui.SvgText(float(point.x), float(point.y), text)
 
-    def main(self, *userdata):
-        self.voronoi_game, self.logger = userdata
+    def main(self, voronoi_game, logger, raster_board=False):
+        self.voronoi_game, self.logger = voronoi_game, logger
         self.voronoi_game.set_app(self)
         self.vis_width = constants.vis_width
         self.vis_height = constants.vis_height
         self.padding_factor = 1. + 2 * constants.vis_padding
 
-        self.prev_day = 0
-        self.prev_state = 0
         self.curr_day = 0
         self.curr_state = 0
 
@@ -105,7 +145,9 @@ class VoronoiApp(App):
 
         ch_hbox = gui.HBox()
         self.view_drop_down = gui.DropDown(style={'padding': '5px', 'text-align': 'center'})
-        for i in range(self.voronoi_game.last_day):
+        # A game may still be played while it is shown: days are listed as they complete, see idle()
+        self.days_listed = self.voronoi_game.num_days
+        for i in range(self.days_listed):
             self.view_drop_down.append("Day {}".format(i + 1), i)
 
         self.view_drop_down.onchange.do(self.view_drop_down_changed)
@@ -118,6 +160,10 @@ class VoronoiApp(App):
         menuContainer.append(gui.Label())
         menuContainer.append(ch_hbox)
 
+        self.follow_live = gui.CheckBoxLabel("Follow the game live", False, style={'margin': '5px auto'})
+        self.follow_live.onchange.do(self.follow_live_changed)
+        menuContainer.append(self.follow_live)
+
         lb_hbox = [gui.HBox()]
         name_label = gui.Label("Name of the Player", style={'margin': '5px auto', 'font-weight': 'bold'})
         score_label = gui.Label("Cells Currently Occupied", style={'margin': '5px auto', 'font-weight': 'bold'})
@@ -135,7 +181,24 @@ class VoronoiApp(App):
             lb_hbox[i + 1].append(self.labels[((i * 3) + 1):((i * 3) + 4)])
             menuContainer.append(lb_hbox[i + 1])
 
+        # Open on the last day played of a game still being played, and follow it
+        if self.days_listed < self.voronoi_game.last_day:
+            start_view = (self.days_listed - 1, 2)
+        else:
+            start_view = (0, 0)
+
         self.load_map()
+        if raster_board:
+            self.board = RasterBoard(self.voronoi_game, style={
+                'width': "{}vh".format(100 * constants.vis_height_ratio * self.padding_factor), 'margin': '0 auto',
+                'image-rendering': 'pixelated'})
+            self.display_map(*start_view)
+            boardContainer.append(self.board)
+            mainContainer.append(boardContainer)
+            mainContainer.append(menuContainer)
+            return mainContainer
+
+        self.board = None
         self.svgplot = gui.Svg(width="{}vw".format(constants.vis_width_ratio * self.padding_factor),
                                height="{}vh".format(100 * constants.vis_height_ratio * self.padding_factor),
                                style={'background-color': '#FFFFFF', 'margin': '0 auto',
@@ -143,9 +206,19 @@ class VoronoiApp(App):
                                       'min-height': str(self.vis_height * self.padding_factor)})
         self.svgplot.set_viewbox(0, 0, self.vis_width * self.padding_factor, self.vis_height * self.padding_factor)
         self.svgplot.attr_preserveAspectRatio = "xMidYMid"
+
+        # Layers, bottom to top: tiles, bases and map border, units. remi sends the whole content of a widget whose
+        # children changed, so tiles are kept in a group per column of the map and only changed columns are redrawn.
+        self.tile_layer = gui.SvgGroup()
+        self.tile_layer.attributes['shape-rendering'] = 'crispEdges'
+        self.tile_columns = [gui.SvgGroup() for _ in range(constants.max_map_dim)]
+        self.tile_layer.append(self.tile_columns)
+        self.tile_owner = None  # Map state shown by the tiles
+        self.svgplot.append(self.tile_layer)
         self.plot_base()
-        self.base_keys = list(self.svgplot.children.keys())
-        self.display_map(0, 0)
+        self.unit_layer = gui.SvgGroup()
+        self.svgplot.append(self.unit_layer)
+        self.display_map(*start_view)
 
         boardContainer.append(self.svgplot)
         mainContainer.append(boardContainer)
@@ -167,7 +240,6 @@ class VoronoiApp(App):
         self.logger.info("Base Scaling visualization by factors {}".format(float(self.scale.x), float(self.scale.y)))
 
     def plot_base(self):
-        self.reset_svgplot()
         unit_h = [[0, 0], [0, 2], [2, 2], [2, 0], [0, 0]]
         for i in range(constants.no_of_players):
             base_off_x = self.base[i].x - 1
@@ -180,22 +252,26 @@ class VoronoiApp(App):
 
         p = self.draw_polygon(self.voronoi_map)
         p.set_stroke(1, "black")
+        p.set_fill("none")  # Drawn over the tiles
         self.svgplot.append(p)
 
     def display_map(self, day, state):
-        self.prev_day = self.curr_day
-        self.prev_state = self.curr_state
         self.curr_day = day
         self.curr_state = state
 
-        self.reset_svgplot()
-        self.plot_tiles()
-        self.base_keys = list(self.svgplot.children.keys())
+        if self.board is not None:
+            self.board.display(day, state)
+        else:
+            self.plot_tiles()
+            self.unit_layer.empty()
+            self.plot_units()
         self.update_table()
-        self.plot_units()
 
         self.view_drop_down.select_by_key(day)
 
+        # Following the game live is the same as showing the end of the last day played
+        self.follow_live.set_value(day == self.days_listed - 1 and state == 2)
+
         if state == 0:
             self.set_label_text("Start of Day")
         elif state == 1:
@@ -203,42 +279,37 @@ class VoronoiApp(App):
         else:
             self.set_label_text("End of Day")
 
-    def reset_svgplot(self):
-        if len(self.svgplot.children) == 0:
-            self.svgplot.empty()
-        else:
-            for k in list(self.svgplot.children.keys()):
-                if k not in self.base_keys:
-                    self.svgplot.remove_child(self.svgplot.children[k])
-
     def plot_tiles(self):
-        if self.curr_day == 0 and self.curr_state == 0:
-            tmp = [Point(25, 25), Point(25, 75),
-                   Point(75, 75), Point(75, 25)]
-            q_t = [[0, 0], [0, 50], [50, 50], [50, 0], [0, 0]]
-            for i in range(constants.no_of_players):
-                off_x = tmp[i].x - 25
-                off_y = tmp[i].y - 25
-                base_marker = Polygon([(x + off_x, y + off_y) for x, y in q_t])
-
-                t = self.draw_polygon(base_marker)
-                t.set_fill(constants.tile_color[i])
-                self.svgplot.append(t)
-
+        """Update the tiles to the map of the current day and state, redrawing only the columns of the map with
+        cells whose owner changed"""
+        map_state = np.asarray(self.voronoi_game.map_states[self.curr_day][self.curr_state])
+        if self.tile_owner is None:
+            changed_columns = range(constants.max_map_dim)
         else:
-            unit_t = [[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]
-            for i in range(constants.max_map_dim):
-                for j in range(constants.max_map_dim):
-                    if self.voronoi_game.map_states[self.curr_day][self.curr_state][i][j] != \
-                            self.voronoi_game.map_states[self.prev_day][self.prev_state][i][j]:
-                        tile = Polygon([(x + i, y + j) for x, y in unit_t])
-                        t = self.draw_polygon(tile)
-                        if self.voronoi_game.map_states[self.curr_day][self.curr_state][i][j] > 0:
-                            t.set_fill(constants.tile_color[
-                                           self.voronoi_game.map_states[self.curr_day][self.curr_state][i][j] - 1])
-                        else:
-                            t.set_fill(constants.dispute_color)
-                        self.svgplot.append(t)
+            changed_columns = np.flatnonzero(np.any(map_state != self.tile_owner, axis=1))
+        for x in changed_columns:
+            self.tile_columns[x].empty()
+            self.tile_columns[x].append(self.draw_tile_column(x, map_state[x]))
+        self.tile_owner = map_state.copy()
+
+    def draw_tile_column(self, x, owners):
+        """Rectangles of a column of the map, one per run of consecutive cells with the same owner
+
+        Args:
+            x: Column of the map
+            owners: Shape: [N,]. owners[y] is the state of the cell (x, y): -1 disputed, 1-4 players.
+        """
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(owners)) + 1))
+        ends = np.append(starts[1:], len(owners))
+        scale = min(self.scale.x * self.vis_width, self.scale.y * self.vis_height)
+        rects = []
+        for start, end in zip(starts, ends):
+            corner = self.convert_coord((x, start))
+            rect = gui.SvgRectangle(float(corner.x), float(corner.y), float(scale), float(scale * (end - start)))
+            owner = owners[start]
+            rect.set_fill(constants.tile_color[owner - 1] if owner > 0 else constants.dispute_color)
+            rects.append(rect)
+        return rects
 
     def plot_units(self):
         for i in range(constants.no_of_players):
@@ -246,19 +317,36 @@ class VoronoiApp(App):
                 c = self.draw_circle(self.voronoi_game.unit_pos[self.curr_day][self.curr_state][i][j], 0.5)
                 c.set_fill(constants.player_color[i])
                 c.set_stroke(1, "black")
-                self.svgplot.append(c)
+                self.unit_layer.append(c)
 
                 text = self.draw_text(self.voronoi_game.unit_pos[self.curr_day][self.curr_state][i][j],
                                       self.voronoi_game.unit_id[self.curr_day][self.curr_state][i][j])
                 text.set_stroke(1, "black")
                 text.set_style(style="font-size:10")
-                self.svgplot.append(text)
+                self.unit_layer.append(text)
 
                 if self.curr_state == 1:
                     path = self.draw_line(self.voronoi_game.unit_pos[self.curr_day][self.curr_state - 1][i][j],
                                           self.voronoi_game.unit_pos[self.curr_day][self.curr_state][i][j])
                     path.set_stroke(1, "black")
-                    self.svgplot.append(path)
+                    self.unit_layer.append(path)
+
+    def idle(self):
+        """Called by remi every update_interval: list the days played since the last call, and show the last one
+        when following the game live"""
+        num_days = self.voronoi_game.num_days
+        if num_days == self.days_listed:
+            return
+        for day in range(self.days_listed, num_days):
+            self.view_drop_down.append("Day {}".format(day + 1), day)
+        following = self.follow_live.get_value()
+        self.days_listed = num_days
+        if following:
+            self.display_map(num_days - 1, 2)
+
+    def follow_live_changed(self, widget, value):
+        if value:
+            self.display_map(self.days_listed - 1, 2)
 
     def set_label_text(self, text, label_num=0):
         self.labels[label_num].set_text(text)
@@ -287,7 +375,7 @@ class VoronoiApp(App):
 
     def next_state_bt_press(self, widget):
         if self.curr_state == 2:
-            if self.curr_day != self.voronoi_game.last_day - 1:
+            if self.curr_day != self.days_listed - 1:
                 self.set_label_text("Processing...")
                 self.do_gui_update()
                 self.display_map(self.curr_day + 1, 0)
@@ -297,7 +385,7 @@ class VoronoiApp(App):
             self.display_map(self.curr_day, self.curr_state + 1)
 
     def next_day_bt_press(self, widget):
-        if self.curr_day != self.voronoi_game.last_day - 1:
+        if self.curr_day != self.days_listed - 1:
             self.set_label_text("Processing...")
             self.do_gui_update()
             self.display_map(self.curr_day + 1, 0)
@@ -305,11 +393,11 @@ class VoronoiApp(App):
     def go_end_bt_press(self, widget):
         self.set_label_text("Processing...")
         self.do_gui_update()
-        self.display_map(self.voronoi_game.last_day - 1, 2)
+        self.display_map(self.days_listed - 1, 2)
 
     def view_drop_down_changed(self, widget, value):
         day = widget.get_key()
-        if 0 <= day < self.voronoi_game.last_day:
+        if 0 <= day < self.days_listed:
             self.set_label_text("Processing...")
             self.do_gui_update()
             self.display_map(day, 0)
@@ -0,0 +1,188 @@
+import numpy as np
+import scipy
+import scipy.ndimage
+
+import constants
+from game_engine import FastMapState, move_units
+
+
+class VoronoiVecEnv:
+    def __init__(self, num_envs, spawn_day=5, last_day=100):
+        """Vectorized environment stepping num_envs independent games in lockstep, one day per step.
+
+        The agent controls the units of all 4 players. Each unit has a fixed slot: the unit created by spawn k
+        (unit id k + 1) is in slot k, so every array has the same shape for the whole game. Occupancy maps,
+        killed units and scores of all games are computed together, with the same rules as GameEngine.
+
+        Args:
+            num_envs: Number of games played in lockstep
+            spawn_day: Number of days after which a new unit spawns at the home base
+            last_day: Total number of days the game goes on for
+        """
+        self.num_envs = num_envs
+        self.spawn_day = spawn_day
+        self.last_day = last_day
+        self.max_units = (last_day - 1) // spawn_day + 1  # Slots per player
+        self.map_size = constants.max_map_dim
+
+        self.fast_map = FastMapState(self.map_size, constants.base)
+
+        self.day = 0
+        self.unit_pos = None  # Shape: [E, 4, K, 2]. Position (x, y) of each unit slot
+        self.unit_alive = None  # Shape: [E, 4, K]. Whether each unit slot holds a living unit
+        self.occupancy_map = None  # Shape: [E, N, N]. 0-3: Player, 4: Disputed. Indexed as [row = y, col = x]
+        self.player_total_score = None  # Shape: [E, 4]
+
+    @property
+    def done(self):
+        return self.day >= self.last_day
+
+    def reset(self):
+        """Start new games. Returns the observation at the start of the first day."""
+        self.day = 0
+        self.unit_pos = np.zeros((self.num_envs, constants.no_of_players, self.max_units, 2), dtype=np.float64)
+        self.unit_alive = np.zeros((self.num_envs, constants.no_of_players, self.max_units), dtype=bool)
+        self.player_total_score = np.zeros((self.num_envs, constants.no_of_players), dtype=np.int64)
+        self._spawn()
+        self.occupancy_map = self.compute_occupancy_maps(self.unit_pos, self.unit_alive)
+        return self.get_obs()
+
+    def step(self, actions):
+        """Play one day of every game
+
+        Args:
+            actions: Shape: [E, 4, K, 2]. (distance, angle) of the move of each unit slot. Like in GameEngine,
+                distance is capped at 1km and moves with a non-finite value are ignored. Empty slots are ignored.
+
+        Returns:
+            obs: Observation at the start of the next day, see get_obs()
+            rewards: Shape: [E, 4]. Score of each player at the end of the day, the cells it occupies
+            dones: Shape: [E,]. Whether the games are over. Games are in lockstep, so all are done together.
+            info: Dict. "player_total_score" - Shape: [E, 4]. Total score of each player.
+        """
+        if self.done:
+            raise RuntimeError("Games are over, call reset()")
+        actions = np.asarray(actions, dtype=np.float64)
+        expected_shape = self.unit_alive.shape + (2,)
+        if actions.shape != expected_shape:
+            raise ValueError("Expected actions of shape {}, got {}".format(expected_shape, actions.shape))
+
+        # After units move
+        distance, angle = actions[..., 0], actions[..., 1]
+        is_move = self.unit_alive & np.isfinite(distance) & np.isfinite(angle)
+        new_pos = move_units(self.unit_pos, np.where(is_move, distance, 0), np.where(is_move, angle, 0))
+        self.unit_pos = np.where(is_move[..., None], new_pos, self.unit_pos)
+        occupancy_map = self.compute_occupancy_maps(self.unit_pos, self.unit_alive)
+
+        # End of day: only games in which a unit was killed need a recompute
+        unit_alive = self.get_connected_units(occupancy_map, self.unit_pos, self.unit_alive)
+        killed = np.any(unit_alive != self.unit_alive, axis=(1, 2))
+        if killed.any():
+            occupancy_map[killed] = self.compute_occupancy_maps(self.unit_pos[killed], unit_alive[killed])
+        self.unit_alive = unit_alive
+
+        rewards = np.stack([np.count_nonzero(occupancy_map == player, axis=(1, 2))
+                            for player in range(constants.no_of_players)], axis=1)
+        self.player_total_score += rewards
+
+        # Start of next day
+        self.day += 1
+        if not self.done and self.day % self.spawn_day == 0:
+            self._spawn()
+            occupancy_map = self.compute_occupancy_maps(self.unit_pos, self.unit_alive)
+        self.occupancy_map = occupancy_map
+
+        dones = np.full(self.num_envs, self.done)
+        info = {"player_total_score": self.player_total_score.copy()}
+        return self.get_obs(), rewards, dones, info
+
+    def get_obs(self):
+        """Observation of all games at the start of the current day
+
+        Returns:
+            Dict.
+                "map_state" - Shape: [E, 100, 100]. int8 occupancy indexed as [x][y]. -1 is disputed, 1-4 is players.
+                "unit_pos" - Shape: [E, 4, K, 2]. Position (x, y) of each unit slot, 0 for empty slots.
+                "unit_alive" - Shape: [E, 4, K]. Whether each unit slot holds a living unit.
+                "day" - int. Current day, from 0.
+        """
+        map_state = self.occupancy_map.astype(np.int8) + 1
+        map_state[map_state == 5] = -1
+        return {
+            "map_state": np.ascontiguousarray(map_state.transpose(0, 2, 1)),
+            "unit_pos": np.where(self.unit_alive[..., None], self.unit_pos, 0),
+            "unit_alive": self.unit_alive.copy(),
+            "day": self.day,
+        }
+
+    def _spawn(self):
+        """New unit at the home base of each player, in the slot of the current spawn"""
+        slot = self.day // self.spawn_day
+        self.unit_pos[:, :, slot] = constants.base
+        self.unit_alive[:, :, slot] = True
+
+    def _get_unit_cells(self, unit_pos, unit_alive):
+        """Game, player and cell (row, col) of each living unit"""
+        env, player, slot = np.nonzero(unit_alive)
+        cells = unit_pos[env, player, slot].astype(int)  # Truncates like int()
+        return env, player, cells[:, 1], cells[:, 0]
+
+    def compute_occupancy_maps(self, unit_pos, unit_alive) -> np.ndarray:
+        """Occupancy maps of a batch of games, same as FastMapState.compute_occupancy_map() for each game
+
+        Args:
+            unit_pos: Shape: [E, 4, K, 2]. Position (x, y) of each unit slot.
+            unit_alive: Shape: [E, 4, K]. Whether each unit slot holds a living unit.
+
+        Returns:
+            np.ndarray: Shape: [E, N, N]. 0-3: Player, 4: Disputed.
+        """
+        num_envs = unit_pos.shape[0]
+        env, player, rows, cols = self._get_unit_cells(unit_pos, unit_alive)
+        players_in_cell = np.zeros((num_envs, self.map_size, self.map_size), dtype=np.uint8)
+        np.bitwise_or.at(players_in_cell, (env, rows, cols), np.uint8(1) << player.astype(np.uint8))
+        unit_occ_map = self.fast_map.unit_occ_lut[players_in_cell]
+
+        player_dist = self.get_player_dist_maps(unit_occ_map)
+        owner, _ = FastMapState._nearest_owner(player_dist)
+        return np.where(unit_occ_map > 4, owner, unit_occ_map)
+
+    def get_player_dist_maps(self, unit_occ_map) -> np.ndarray:
+        """Batched FastMapState.get_player_dist_map()
+
+        Args:
+            unit_occ_map: Shape: [E, N, N]. Cells containing units of each game.
+
+        Returns:
+            np.ndarray: Shape: [4, E, N, N]. Exact integer squared distance, in cells. Max int if player has no units.
+        """
+        not_unit = unit_occ_map[None] != np.arange(constants.no_of_players, dtype=np.uint8)[:, None, None, None]
+        player_dist = np.full(not_unit.shape, np.iinfo(np.int64).max, dtype=np.int64)
+        # One transform per map: a single transform over the stacked maps, spaced apart along the stacking axis,
+        # gives the same distances but is several times slower.
+        for player, env in zip(*np.nonzero(~not_unit.all(axis=(2, 3)))):
+            near_idx = scipy.ndimage.distance_transform_edt(not_unit[player, env], return_distances=False,
+                                                            return_indices=True)
+            player_dist[player, env] = np.sum((near_idx - self.fast_map.cell_idx) ** 2, axis=0)
+        return player_dist
+
+    def get_connected_units(self, occupancy_map, unit_pos, unit_alive) -> np.ndarray:
+        """Batched FastMapState.remove_killed_units(): units with a path to their home base, through cells
+        occupied by their player
+
+        Returns:
+            np.ndarray: Shape: [E, 4, K]. Whether each unit slot holds a living unit after isolated units are killed.
+        """
+        env, player, rows, cols = self._get_unit_cells(unit_pos, unit_alive)
+        is_player = occupancy_map[:, None] == np.arange(constants.no_of_players, dtype=np.uint8)[:, None, None]
+        labels = FastMapState.label_components(is_player.reshape(-1, self.map_size, self.map_size))
+        labels = labels.reshape(is_player.shape)  # Shape: [E, 4, N, N]
+
+        # Label of the home base component of each player. 0 if home base is not occupied by the player
+        home_labels = labels[:, np.arange(constants.no_of_players), self.fast_map.home_rows, self.fast_map.home_cols]
+        unit_labels = labels[env, player, rows, cols]
+        connected = (unit_labels > 0) & (unit_labels == home_labels[env, player])
+
+        unit_alive = unit_alive.copy()
+        unit_alive[unit_alive] = connected  # nonzero() order, same as _get_unit_cells()
+        return unit_alive
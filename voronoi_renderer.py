@@ -1,11 +1,12 @@
 from typing import Dict, Tuple, List, Optional
 
 import cv2
-import matplotlib as mpl
 import numpy as np
 
 
 class VoronoiRender:
+    LINE = 5  # Palette index of grid lines
+
     def __init__(self, map_size: int, scale_px: int = 10, unit_px: int = 10):
         """Class to render the game map and parse screen/game coords
 
@@ -28,10 +29,32 @@ class VoronoiRender:
         player_colors = ['#e6194B', '#f58231', '#3cb44b', '#4363d8']
         self.player_colors = list(map(self._hex_to_rgb, player_colors))
 
+        # RGB of each occupancy value (players 0-3, 4 contested), then of grid lines
+        self.palette = np.array(list(map(self._hex_to_rgb, [*self.player_back_colors, '#ffffff', '#000000'])),
+                                dtype=np.uint8)
+
+        # Colored map of the last call, updated cell by cell
+        self._layouts = {}  # Map shape -> pixels of each cell, grid line mask
+        self._background = None
+        self._background_occ = None
+        self._background_key = None
+
     @staticmethod
     def _hex_to_rgb(col: str = "#ffffff"):
         return tuple(int(col.lstrip('#')[i:i + 2], 16) for i in (0, 2, 4))
 
+    @staticmethod
+    def get_occ_map(map_state: np.ndarray) -> np.ndarray:
+        """Occupancy map of a map state of the game
+
+        Args:
+            map_state: Shape: [n, n]. map_state[x][y] is -1 for disputed cells, 1-4 for players.
+
+        Return:
+            np.ndarray: Shape: [n, n]. occ_map[y][x] as taken by get_colored_occ_map(): 0-3 players, 4 contested.
+        """
+        return np.where(map_state < 0, 4, map_state - 1).T
+
     def metric_to_px(self, pos: Tuple[float, float]) -> Tuple[int, int]:
         """Convert metric unit pos (x, y) to pixel location on img of grid"""
         x, y = pos
@@ -56,18 +79,22 @@ class VoronoiRender:
         x, y = map(lambda z: round(z / self.scale_px, 2), [px, py])
         return x, y
 
-    # noinspection PyArgumentList
     def get_colored_occ_map(self,
                             occ_map: np.ndarray,
-                            units: Optional[List[List[List[Tuple]]]] = None,
+                            units: Optional[List] = None,
                             draw_major_lines: bool = True):
         """Visualizes an NxN Occupancy map for the voronoi game.
 
+        The colored, upsampled map with its grid lines is kept between calls: only the cells that changed since the
+        previous call are redrawn, then the units are drawn on a copy.
+
         Args:
             occ_map: Occupancy map. Shape: [n, n].
                 Each cell is assigned a number from 0-4: 0-3 represents a player occupying it, 4 means contested
             units: If provided, will draw them on the map.
                 List of shapely Points representing unit pos: u[player][id][pos].  (remove day and state)
+                Or the positions of the units of each player as arrays, u[player] of shape [N, 2], e.g.
+                UnitState.player_pos(player), which avoids creating Points.
             draw_major_lines: Draw grid lines
 
         Return:
@@ -77,36 +104,68 @@ class VoronoiRender:
         if occ_map.min() < 0 or occ_map.max() > 4:
             raise ValueError(f"Occupancy Map must contain values between 0-4")
 
-        # Map cell states to colors
-        # Colors from https://sashamaps.net/docs/resources/20-colors/
-        cmap = mpl.colors.ListedColormap([*self.player_back_colors, '#ffffff'])
-        norm = mpl.colors.BoundaryNorm([-0.5, 0.5, 1.5, 2.5, 3.5, 4.5], 5)  # 4 Discrete colors
-        grid_rgb = cmap(norm(occ_map))[:, :, :3]
-        grid_rgb = (grid_rgb * 255).astype(np.uint8)
-
-        # Upsample img
-        grid_rgb = cv2.resize(grid_rgb, None, fx=self.scale_px, fy=self.scale_px, interpolation=cv2.INTER_NEAREST)
-
-        # Draw stuff
-        if draw_major_lines:
-            h, w, _ = grid_rgb.shape
-            # Only show major grid lines (100x100 lines too fine) - max 10
-            cols = min(10, occ_map.shape[1])
-            col_line = (0, 0, 0)
-            thickness = self.grid_line_thickness
-            for x in np.linspace(start=int(thickness / 2), stop=w - int(thickness / 2), num=cols + 1):
-                x = int(round(x))
-                cv2.line(grid_rgb, (x, 0), (x, h), color=col_line, thickness=thickness)
-                cv2.line(grid_rgb, (0, x), (w, x), color=col_line, thickness=thickness)
+        grid_rgb = self._update_background(occ_map, draw_major_lines).copy()
 
         if units is not None:
             # self.unit_pos[day][0] =
             # units[player][pos]]
             for player in range(4):
-                for pt in units[player]:
-                    pos = pt.coords[:][0]
+                player_pos = units[player]
+                if not isinstance(player_pos, np.ndarray):
+                    player_pos = [pt.coords[:][0] for pt in player_pos]
+                for pos in player_pos:
                     # Draw Circle for each unit
                     pos_px = self.metric_to_px(pos)
                     cv2.circle(grid_rgb, pos_px, self.unit_size_px, self.player_colors[player], -1)
 
         return grid_rgb
+
+    def _update_background(self, occ_map: np.ndarray, draw_major_lines: bool) -> np.ndarray:
+        """Colored map with grid lines, without units. Shape: [h, w, 3].
+        Only the cells that differ from the previous occupancy map are colored again."""
+        key = (occ_map.shape, draw_major_lines)
+        if self._background_key != key:
+            # Upsample the palette index of each cell, then color the whole image with one lookup
+            cells = cv2.resize(occ_map.astype(np.uint8), None, fx=self.scale_px, fy=self.scale_px,
+                               interpolation=cv2.INTER_NEAREST)
+            if draw_major_lines:
+                cells[self._get_layout(occ_map.shape)[1]] = self.LINE
+            self._background = self.palette[cells]
+            self._background_occ = occ_map.copy()
+            self._background_key = key
+            return self._background
+
+        changed = np.flatnonzero(occ_map != self._background_occ)
+        if len(changed):
+            cell_px, line_mask = self._get_layout(occ_map.shape)
+            px = cell_px[changed]  # Shape: [k, scale_px * scale_px]. Pixels of each changed cell.
+            cells = np.repeat(occ_map.ravel()[changed].astype(np.uint8)[:, None], px.shape[1], axis=1)
+            if draw_major_lines:
+                cells[line_mask.ravel()[px]] = self.LINE
+            self._background.reshape(-1, 3)[px] = self.palette[cells]
+            self._background_occ[...] = occ_map
+        return self._background
+
+    def _get_layout(self, shape: Tuple[int, int]):
+        """Pixels of each cell and grid line pixels of the upsampled image, computed once per map size.
+
+        Return:
+            np.ndarray: Shape: [n * n, scale_px * scale_px]. Flat index in the image of the pixels of each cell.
+            np.ndarray: Shape: [h, w]. True for pixels on a major grid line.
+        """
+        if shape not in self._layouts:
+            n_rows, n_cols = shape
+            h, w = n_rows * self.scale_px, n_cols * self.scale_px
+            px = np.arange(h * w).reshape(n_rows, self.scale_px, n_cols, self.scale_px)
+            cell_px = px.transpose(0, 2, 1, 3).reshape(n_rows * n_cols, self.scale_px * self.scale_px)
+
+            # Only show major grid lines (100x100 lines too fine) - max 10
+            lines = np.zeros((h, w), dtype=np.uint8)
+            cols = min(10, n_cols)
+            thickness = self.grid_line_thickness
+            for x in np.linspace(start=int(thickness / 2), stop=w - int(thickness / 2), num=cols + 1):
+                x = int(round(x))
+                cv2.line(lines, (x, 0), (x, h), color=1, thickness=thickness)
+                cv2.line(lines, (0, x), (w, x), color=1, thickness=thickness)
+            self._layouts[shape] = (cell_px, lines.astype(bool))
+        return self._layouts[shape]